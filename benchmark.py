@@ -0,0 +1,154 @@
+"""Zestaw programów wzorcowych i kontrola regresji kosztu kodu.
+
+Programy leżą w benchmarks/, a benchmarks/corpus.json zapisuje dla każdego z nich dane
+wejściowe, oczekiwane wyjście i koszt wykonania na symulatorze z vm.py oraz liczbę
+rozkazów i czas kompilacji z domyślnymi przebiegami. Zmiana kompilatora nie przechodzi,
+gdy wyjście się nie zgadza albo koszt lub czas kompilacji wzrośnie ponad próg; --update
+zapisuje bieżące pomiary jako nowy punkt odniesienia. Razem z czasem kompilacji zapisywany
+jest czas stałej pracy wzorcowej (reference_time) zmierzonej tuż przed kompilacją, którym
+czas bieżący jest przeskalowany przed porównaniem - próg nie zależy wtedy od szybkości
+i obciążenia maszyny.
+
+Użycie: python benchmark.py [program ...] [--update]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from vm import run
+from ir import assemble
+from passes import select_passes, MAX_LEVEL
+from kompilator import compile_source
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+CORPUS = os.path.join(BENCHMARK_DIR, 'corpus.json')
+
+# Koszt wykonania jest deterministyczny, więc domyślnie każdy wzrost jest regresją
+COST_THRESHOLD = 0.0
+# Czas kompilacji zależy od maszyny: dopuszczalny wzrost względny i bezwzględny zapas w sekundach
+TIME_THRESHOLD = 0.5
+TIME_SLACK = 0.05
+# Czas kompilacji to najlepszy z tylu pomiarów
+COMPILE_REPEATS = 5
+# Liczba kroków pracy wzorcowej mierzonej razem z kompilacją
+REFERENCE_STEPS = 200000
+
+
+def reference_time():
+    """Czas stałej pracy w Pythonie - miara szybkości maszyny w chwili pomiaru."""
+    start = time.perf_counter()
+    counts = {}
+    for i in range(REFERENCE_STEPS):
+        counts[i % 1000] = counts.get(i % 1000, 0) + i
+    return time.perf_counter() - start
+
+
+def compile_benchmark(source):
+    """Zwraca (kod maszyny wirtualnej, czas kompilacji, czas pracy wzorcowej) - w sekundach,
+    z pomiaru o najmniejszym stosunku czasu kompilacji do czasu pracy wzorcowej."""
+    selected = select_passes(MAX_LEVEL)
+    best = None
+    for _ in range(COMPILE_REPEATS):
+        # Praca wzorcowa tuż przed kompilacją trafia na to samo obciążenie maszyny
+        reference = reference_time()
+        start = time.perf_counter()
+        gen, _ = compile_source(source, selected)
+        elapsed = time.perf_counter() - start
+        if gen is None:
+            raise Exception("Błąd składni w programie wzorcowym")
+        if best is None or elapsed / reference < best[0] / best[1]:
+            best = (elapsed, reference)
+    return assemble(gen.instructions), best[0], best[1]
+
+
+def change(current, baseline):
+    if not baseline:
+        return ''
+    return f"{(current - baseline) * 100 / baseline:+.1f}%"
+
+
+def check_benchmark(name, entry, cost_threshold, time_threshold):
+    """Mierzy program name; zwraca (wiersze raportu, lista błędów, nowy zapis do korpusu) -
+    zapisu nie ma (None), gdy wyjście programu jest niepoprawne."""
+    with open(os.path.join(BENCHMARK_DIR, f"{name}.imp"), 'r') as f:
+        source = f.read()
+    code, elapsed, reference = compile_benchmark(source)
+
+    rows = []
+    errors = []
+    measured = {'instructions': len(code), 'compile_time': round(elapsed, 4),
+                'reference_time': round(reference, 4), 'cases': []}
+    correct = True
+
+    limit = entry.get('compile_time')
+    if limit is not None:
+        # Czas bieżący w skali maszyny, na której zapisano punkt odniesienia
+        scaled = elapsed * entry.get('reference_time', reference) / reference
+        if scaled > limit * (1 + time_threshold) + TIME_SLACK:
+            errors.append(f"{name}: czas kompilacji {scaled * 1000:.1f} ms po przeskalowaniu"
+                          f" (poprzednio {limit * 1000:.1f} ms)")
+
+    for number, case in enumerate(entry['cases'], 1):
+        result = run(code, case['input'])
+        if result.outputs != case['output']:
+            errors.append(f"{name} #{number}: niepoprawne wyjście {result.outputs[:8]}"
+                          f" (oczekiwano {case['output'][:8]})")
+            correct = False
+        baseline = case.get('cost')
+        if baseline is not None and result.cost > baseline * (1 + cost_threshold):
+            errors.append(f"{name} #{number}: koszt {result.cost} (poprzednio {baseline})")
+        rows.append(f"{name:12}{number:>3}{result.cost:14}{baseline if baseline is not None else '-':>14}"
+                    f"{change(result.cost, baseline):>9}{len(code):10}{change(len(code), entry.get('instructions')):>9}"
+                    f"{elapsed * 1000:16.1f}")
+        measured['cases'].append(dict(case, cost=result.cost))
+    return rows, errors, measured if correct else None
+
+
+def main():
+    args = argparse.ArgumentParser(description="Koszt i czas kompilacji programów wzorcowych z benchmarks/")
+    args.add_argument('programs', nargs='*', metavar='program', help="nazwy programów (domyślnie wszystkie)")
+    args.add_argument('--cost-threshold', type=float, default=COST_THRESHOLD, metavar='UŁAMEK',
+                      help=f"dopuszczalny względny wzrost kosztu (domyślnie {COST_THRESHOLD})")
+    args.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD, metavar='UŁAMEK',
+                      help=f"dopuszczalny względny wzrost czasu kompilacji (domyślnie {TIME_THRESHOLD})")
+    args.add_argument('--update', action='store_true',
+                      help="zapisuje bieżący koszt, liczbę rozkazów i czas kompilacji w corpus.json")
+    options = args.parse_args()
+
+    with open(CORPUS, 'r') as f:
+        corpus = json.load(f)
+    for name in options.programs:
+        if name not in corpus:
+            raise Exception(f"Nieznany program wzorcowy {name} (dostępne: {', '.join(corpus)})")
+    names = options.programs or list(corpus)
+
+    print(f"{'program':12}{'nr':>3}{'koszt':>14}{'poprzednio':>14}{'zmiana':>9}"
+          f"{'rozkazy':>10}{'zmiana':>9}{'kompilacja [ms]':>16}")
+    errors = []
+    correct = True
+    for name in names:
+        rows, failed, measured = check_benchmark(name, corpus[name], options.cost_threshold, options.time_threshold)
+        print("\n".join(rows))
+        errors += failed
+        if measured is None:
+            correct = False
+        else:
+            corpus[name] = measured
+
+    if errors:
+        print()
+        print("\n".join(errors))
+    if options.update:
+        if not correct:
+            print("Nie zapisano corpus.json: niepoprawne wyjście")
+            sys.exit(1)
+        with open(CORPUS, 'w') as f:
+            json.dump(corpus, f, indent=2)
+            f.write("\n")
+        print(f"Zapisano {CORPUS}")
+    elif errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Układ bloków podstawowych w kodzie pośrednim.
+
+Przebieg działa przed optimize() z peephole.py i ogranicza liczbę wykonywanych skoków:
+- skok do bloku zawierającego tylko JUMP trafia od razu do jego celu,
+- JPOS/JZERO przeskakujący pojedynczy JUMP zostaje odwrócony (ra >= 0, więc JPOS i
+  JZERO są swoimi zaprzeczeniami), a JUMP znika,
+- łańcuchy bloków połączonych przejściem dalej są ustawiane tak, by blok docelowy
+  bezwarunkowego skoku następował zaraz po nim, a sam skok znika.
+"""
+from vm import COSTS
+from ir import Label, Instruction, referenced_labels, split_blocks, join_blocks, JUMP, JPOS, JZERO, RTRN, HALT
+
+INVERTED = {JPOS: JZERO, JZERO: JPOS}
+
+
+def falls_through(block):
+    last = block.last()
+    return last is None or last[0] not in (JUMP, RTRN, HALT)
+
+
+def retarget(instruction, op, label):
+    # Zachowuje miejsce w źródle, jeśli rozkaz je ma
+    if isinstance(instruction, Instruction):
+        return instruction.replace(op, label)
+    return (op, label)
+
+
+def is_jump_only(block):
+    return len(block.instructions) == 1 and block.instructions[0][0] == JUMP
+
+
+def thread_jumps(blocks):
+    # Cel skoku do bloku z samym JUMP - aż do pierwszego bloku, który coś wykonuje
+    forward = {}
+    for block in blocks:
+        if is_jump_only(block):
+            for label in block.labels:
+                forward[label] = block.instructions[0][1]
+
+    def resolve(label):
+        seen = set()
+        while label in forward and label not in seen:
+            seen.add(label)
+            label = forward[label]
+        return label
+
+    threaded = 0
+    for block in blocks:
+        last = block.last()
+        if last is None or last[0] not in (JUMP, JPOS, JZERO):
+            continue
+        target = resolve(last[1])
+        if target is not last[1]:
+            block.instructions[-1] = retarget(last, last[0], target)
+            threaded += 1
+    return threaded
+
+
+def invert_branches(blocks):
+    # JPOS L; JUMP M; L: ...  ->  JZERO M; L: ...
+    inverted = 0
+    for n in range(len(blocks) - 2):
+        block, jump, after = blocks[n], blocks[n + 1], blocks[n + 2]
+        last = block.last()
+        if (last is not None and last[0] in INVERTED and last[1] in after.labels
+                and not jump.labels and is_jump_only(jump)):
+            block.instructions[-1] = retarget(last, INVERTED[last[0]], jump.instructions[0][1])
+            jump.instructions = []
+            inverted += 1
+    return [block for block in blocks if block.labels or block.instructions], inverted
+
+
+def chain_blocks(blocks):
+    # Łańcuchy bloków połączonych przejściem dalej muszą pozostać w tej samej kolejności
+    chains = []
+    for block in blocks:
+        if chains and falls_through(chains[-1][-1]):
+            chains[-1].append(block)
+        else:
+            chains.append([block])
+
+    heads = {}
+    for n, chain in enumerate(chains):
+        for label in chain[0].labels:
+            heads[label] = n
+
+    # Łańcuch startowy zostaje pierwszy; za łańcuchem kończącym się JUMP stawiamy
+    # łańcuch, do którego skacze, o ile nie został już umieszczony
+    placed = set()
+    order = []
+    for n in range(len(chains)):
+        while n is not None and n not in placed:
+            placed.add(n)
+            order.append(chains[n])
+            last = chains[n][-1].last()
+            n = heads.get(last[1]) if last is not None and last[0] == JUMP else None
+
+    return [block for chain in order for block in chain]
+
+
+def layout_blocks(code):
+    """Zwraca (nowy kod, statystyki) - liczbę usuniętych skoków i ich łączny koszt."""
+    targets = referenced_labels(code)
+    blocks = split_blocks([item for item in code if not isinstance(item, Label) or item in targets])
+
+    thread_jumps(blocks)
+    blocks, removed = invert_branches(blocks)
+    blocks = chain_blocks(blocks)
+
+    # JUMP do bloku, który po nowym ułożeniu następuje zaraz po nim
+    for n in range(len(blocks) - 1):
+        last = blocks[n].last()
+        if last is not None and last[0] == JUMP and last[1] in blocks[n + 1].labels:
+            blocks[n].instructions.pop()
+            removed += 1
+
+    return join_blocks(blocks), {'removed': removed, 'cost': removed * COSTS[JUMP]}
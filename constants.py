@@ -0,0 +1,93 @@
+"""Budowanie stałych w ra najtańszym ciągiem rozkazów.
+
+Stała powstaje bit po bicie od najstarszego: przedrostek p przechodzi w 2p lub 2p + 1
+przez SHL i INC/DEC. Programowanie dynamiczne trzyma dwa stany - najtańsze dojście do p
+i do p + 1 - a na każdym przedrostku rozważa też start od znanej wartości rejestru
+(INC/DEC lub SHR od niej) albo od zera po RST. Wyniki są zapamiętywane.
+"""
+from functools import lru_cache
+from vm import COSTS, ADD, RST, INC, DEC, SHL, SHR
+
+
+def distance(start, target):
+    # Najtańsze przejście ra od start do target samymi INC, DEC lub SHR.
+    # Rozkazy są zapisane jako serie (opkod, rejestr, liczba powtórzeń).
+    if target >= start:
+        return target - start, ((INC, 'a', target - start),)
+
+    best = (start - target, ((DEC, 'a', start - target),))
+    shifts = 0
+    while start > target:
+        start >>= 1
+        shifts += 1
+        if start < target:
+            break
+        cost = shifts + start - target
+        if cost < best[0]:
+            best = (cost, ((SHR, 'a', shifts), (DEC, 'a', start - target)))
+    return best
+
+
+def starts(known):
+    # Możliwe punkty wyjścia: (koszt, serie rozkazów, wartość ra po nich)
+    result = [(COSTS[RST], ((RST, 'a', 1),), 0)]
+    for register, value in known:
+        if register == 'a':
+            result.append((0, (), value))
+        else:
+            result.append((COSTS[RST] + COSTS[ADD], ((RST, 'a', 1), (ADD, register, 1)), value))
+    return result
+
+
+def expand(runs):
+    steps = []
+    for op, register, count in runs:
+        steps.extend([(op, register)] * count)
+    return steps
+
+
+@lru_cache(maxsize=4096)
+def synthesize(value, known=()):
+    """Zwraca (koszt, rozkazy) budujące value w ra; known - krotka par (rejestr, wartość)."""
+    sources = starts(known)
+
+    def reach(target):
+        best = None
+        for cost, runs, start in sources:
+            extra, moves = distance(start, target)
+            if best is None or cost + extra < best[0]:
+                best = (cost + extra, runs + moves)
+        return best
+
+    shl = COSTS[SHL]
+    inc = COSTS[INC]
+    prefix = 0
+    exact = reach(0)
+    plus_one = reach(1)
+
+    for bit in (bin(value)[2:] if value else ''):
+        prefix = 2 * prefix + int(bit)
+
+        if bit == '0':
+            # 2p = SHL p lub SHL (p + 1) i dwa DEC; 2p + 1 = SHL p i INC lub SHL (p + 1) i DEC
+            options = [(exact[0] + shl, exact[1] + ((SHL, 'a', 1),)),
+                       (plus_one[0] + shl + 2 * inc, plus_one[1] + ((SHL, 'a', 1), (DEC, 'a', 2)))]
+            next_options = [(exact[0] + shl + inc, exact[1] + ((SHL, 'a', 1), (INC, 'a', 1))),
+                            (plus_one[0] + shl + inc, plus_one[1] + ((SHL, 'a', 1), (DEC, 'a', 1)))]
+        else:
+            options = [(exact[0] + shl + inc, exact[1] + ((SHL, 'a', 1), (INC, 'a', 1))),
+                       (plus_one[0] + shl + inc, plus_one[1] + ((SHL, 'a', 1), (DEC, 'a', 1)))]
+            next_options = [(plus_one[0] + shl, plus_one[1] + ((SHL, 'a', 1),)),
+                            (exact[0] + shl + 2 * inc, exact[1] + ((SHL, 'a', 1), (INC, 'a', 2)))]
+
+        options.append(reach(prefix))
+        next_options.append(reach(prefix + 1))
+        exact = min(options, key=lambda option: option[0])
+        plus_one = min(next_options, key=lambda option: option[0])
+
+    return exact[0], tuple(expand(exact[1]))
+
+
+def constant_cost(value):
+    # Koszt zbudowania value bez żadnej wiedzy o rejestrach
+    return synthesize(value)[0]
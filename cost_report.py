@@ -0,0 +1,110 @@
+"""Statyczne szacowanie kosztu wygenerowanego kodu, bez uruchamiania programu.
+
+Koszt rozkazu pochodzi z tabeli vm.COSTS. Obrót pętli to zakres adresów od celu skoku
+wstecz do tego skoku; rozkazy w k zagnieżdżonych obrotach ważone są LOOP_WEIGHT^k, tak
+jak wagi odwołań w generatorze. Miejsce w źródle każdego rozkazu daje ir.Instruction.
+"""
+from vm import COSTS
+from generator import LOOP_WEIGHT
+from ir import label_addresses, instructions_of, JUMP, JPOS, JZERO
+
+BRANCH_OPS = (JUMP, JPOS, JZERO)
+
+# Szerokość kolumny z tekstem linii źródła
+SOURCE_WIDTH = 40
+
+
+def loop_ranges(code):
+    """Zakresy (pierwszy adres, adres skoku wstecz) obrotów pętli, po jednym na cel skoku."""
+    addresses = label_addresses(code)
+    ends = {}
+    for address, (op, arg) in enumerate(instructions_of(code)):
+        if op in BRANCH_OPS and addresses[arg] <= address:
+            target = addresses[arg]
+            ends[target] = max(ends.get(target, address), address)
+    return sorted(ends.items())
+
+
+def loop_weights(code):
+    weights = [1] * len(instructions_of(code))
+    for start, end in loop_ranges(code):
+        for address in range(start, end + 1):
+            weights[address] *= LOOP_WEIGHT
+    return weights
+
+
+def estimated_cost(code):
+    """Koszt kodu z rozkazami w pętlach ważonymi liczbą zagnieżdżeń."""
+    return sum(COSTS[op] * weight for (op, _), weight in zip(instructions_of(code), loop_weights(code)))
+
+
+def scope_name(scope):
+    return scope if scope is not None else '(kod wspólny)'
+
+
+def line_costs(code):
+    # numer linii -> [rozkazy, koszt jednego wykonania, koszt ważony]
+    lines = {}
+    for instruction, weight in zip(instructions_of(code), loop_weights(code)):
+        row = lines.setdefault(getattr(instruction, 'lineno', None), [0, 0, 0])
+        row[0] += 1
+        row[1] += COSTS[instruction[0]]
+        row[2] += COSTS[instruction[0]] * weight
+    return lines
+
+
+def loop_costs(code):
+    # (pierwszy adres, zasięg, znacznik, linia, rozkazy w obrocie, koszt obrotu)
+    instructions = instructions_of(code)
+    loops = []
+    for start, end in loop_ranges(code):
+        body = instructions[start:end + 1]
+        branch = instructions[end]
+        frames = getattr(branch, 'frames', ())
+        tag, lineno = frames[-1] if frames else (None, None)
+        loops.append((start, getattr(branch, 'scope', None), tag, lineno,
+                      len(body), sum(COSTS[op] for op, _ in body)))
+    return loops
+
+
+def procedure_costs(code):
+    # zasięg -> [rozkazy, koszt jednego wykonania, koszt ważony]
+    procedures = {}
+    for instruction, weight in zip(instructions_of(code), loop_weights(code)):
+        row = procedures.setdefault(getattr(instruction, 'scope', None), [0, 0, 0])
+        row[0] += 1
+        row[1] += COSTS[instruction[0]]
+        row[2] += COSTS[instruction[0]] * weight
+    return procedures
+
+
+def format_cost_report(code, source):
+    source_lines = source.splitlines()
+
+    def text(lineno):
+        if lineno is None or not 0 < lineno <= len(source_lines):
+            return ''
+        return source_lines[lineno - 1].strip()[:SOURCE_WIDTH]
+
+    report = ["Szacowany koszt statyczny (pętle ważone x%d na poziom zagnieżdżenia)" % LOOP_WEIGHT, ""]
+
+    report.append(f"{'linia':>6}{'rozkazy':>9}{'koszt':>9}{'ważony':>12}  źródło")
+    lines = line_costs(code)
+    for lineno in sorted(lines, key=lambda n: (n is None, n or 0)):
+        count, cost, weighted = lines[lineno]
+        label = lineno if lineno is not None else '-'
+        report.append(f"{label:>6}{count:9}{cost:9}{weighted:12}  {text(lineno)}")
+
+    report += ["", "Pętle (koszt jednego obrotu, zagnieżdżone pętle liczone raz):"]
+    report.append(f"{'adres':>6}{'linia':>6}  {'instrukcja':12}{'zasięg':16}{'rozkazy':>9}{'koszt':>9}")
+    for start, scope, tag, lineno, count, cost in loop_costs(code):
+        label = lineno if lineno is not None else '-'
+        report.append(f"{start:6}{label:>6}  {tag or '-':12}{scope_name(scope):16}{count:9}{cost:9}")
+
+    report += ["", "Procedury (jedno wykonanie, bez wywoływanych procedur):"]
+    report.append(f"{'zasięg':16}{'rozkazy':>9}{'koszt':>9}{'ważony':>12}")
+    for scope, (count, cost, weighted) in procedure_costs(code).items():
+        report.append(f"{scope_name(scope):16}{count:9}{cost:9}{weighted:12}")
+
+    report += ["", f"Razem: {len(instructions_of(code))} rozkazów, szacowany koszt {estimated_cost(code)}"]
+    return "\n".join(report)
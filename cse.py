@@ -0,0 +1,196 @@
+"""Numerowanie wartości w ciągach instrukcji bez rozgałęzień.
+
+Po przypisaniu x := e zmienna x trzyma wartość e, dopóki nie zmieni się x ani żaden
+składnik e. Kolejne wystąpienia e (wyrażenia albo odczytu t[k]) są wtedy zastępowane
+odczytem x, a przypisanie x := e, gdy x już trzyma e, znika. Kosztowne wyrażenie przypisane
+do elementu tablicy i zaraz powtórzone trafia do ukrytej zmiennej __cse_N - tylko gdy zapis
+do tego elementu nie zmienia składników wyrażenia. Zapis, READ i CALL unieważniają wpisy.
+"""
+from licm import expression_key, names_read, written_names, procedure_signatures, is_cheap
+
+
+def is_value(node):
+    # Wartość, którą opłaca się pamiętać: wyrażenie albo odczyt t[k] z indeksem zmiennym
+    if node[0] == 'BINARY_OP':
+        return True
+    return node[0] == 'ARRAY_ID' and node[2][0] != 'NUM'
+
+
+class ValueNumbering:
+    def __init__(self, signatures):
+        self.signatures = signatures
+        self.params = set()
+        self.temporaries = []
+        self.counter = 0
+
+    def invalidate(self, table, names):
+        # Usuwa wpisy czytające lub trzymane w którejś z names
+        names = set(names)
+        # Parametry procedury mogą wskazywać tę samą zmienną
+        if names & self.params:
+            names |= self.params
+        for key, (holder, read) in list(table.items()):
+            if holder in names or read & names:
+                del table[key]
+
+    def lookup(self, node, table):
+        # Zastępuje node odczytem zmiennej trzymającej jego wartość
+        if node[0] in ['BINARY_OP', 'ARRAY_ID']:
+            entry = table.get(expression_key(node))
+            if entry is not None:
+                return ('ID', entry[0], node[-1])
+        if node[0] == 'BINARY_OP':
+            return ('BINARY_OP', node[1], self.lookup(node[2], table), self.lookup(node[3], table), node[4])
+        return node
+
+    def kills(self, name, read):
+        # Czy zapis do name zmienia któryś ze składników read
+        written = {name}
+        if written & self.params:
+            written |= self.params
+        return bool(written & read)
+
+    def reused_later(self, key, read, target, rest):
+        # Czy wyrażenie key zostanie znów przypisane, zanim zmieni się któryś z jego składników
+        if self.kills(target, read):
+            return False
+        for cmd in rest:
+            if cmd[0] == 'WRITE':
+                continue
+            if cmd[0] != 'ASSIGN':
+                return False
+            if expression_key(cmd[2]) == key:
+                return True
+            if self.kills(cmd[1][1], read):
+                return False
+        return False
+
+    def temporary(self, node, table, result):
+        # __cse_N := node przed bieżącą instrukcją
+        self.counter += 1
+        name = f"__cse_{self.counter}"
+        lineno = node[-1]
+        self.temporaries.append(('VAR', name, lineno))
+        result.append(('ASSIGN', ('ID', name, lineno), node, lineno))
+        table[expression_key(node)] = (name, names_read(node))
+        return ('ID', name, lineno)
+
+    def condition(self, cond, table):
+        return ('CONDITION', cond[1], self.lookup(cond[2], table), self.lookup(cond[3], table), cond[4])
+
+    def commands(self, commands, table=None):
+        table = {} if table is None else table
+        result = []
+
+        for i, cmd in enumerate(commands):
+            tag = cmd[0]
+            rest = commands[i + 1:]
+
+            if tag == 'ASSIGN':
+                target, expr = cmd[1], self.lookup(cmd[2], table)
+                if target[0] == 'ID' and expr[0] == 'ID' and expr[1] == target[1]:
+                    # x := e, gdy x już trzyma wartość e
+                    continue
+                key = expression_key(expr) if is_value(expr) else None
+                read = names_read(expr)
+
+                # Zapis do parametru może zmienić inny parametr czytany w expr
+                aliased = self.kills(target[1], read)
+
+                holder = None
+                if key is not None and not aliased:
+                    if target[0] == 'ID':
+                        holder = target[1]
+                    elif (expr[0] == 'BINARY_OP' and not is_cheap(expr)
+                            and self.reused_later(key, read, target[1], rest)):
+                        expr = self.temporary(expr, table, result)
+
+                result.append(('ASSIGN', target, expr, cmd[3]))
+                self.invalidate(table, [target[1]])
+                if holder is not None:
+                    table[key] = (holder, read)
+
+            elif tag == 'WRITE':
+                result.append(('WRITE', self.lookup(cmd[1], table), cmd[2]))
+
+            elif tag == 'READ':
+                result.append(cmd)
+                self.invalidate(table, [cmd[1][1]])
+
+            elif tag == 'CALL':
+                result.append(cmd)
+                table.clear()
+
+            elif tag == 'IF':
+                cond = self.condition(cmd[1], table)
+                result.append(('IF', cond, self.commands(cmd[2], dict(table)), cmd[3]))
+                self.invalidate_written(table, cmd)
+
+            elif tag == 'IF_ELSE':
+                cond = self.condition(cmd[1], table)
+                result.append(('IF_ELSE', cond, self.commands(cmd[2], dict(table)),
+                               self.commands(cmd[3], dict(table)), cmd[4]))
+                self.invalidate_written(table, cmd)
+
+            elif tag == 'WHILE':
+                result.append(('WHILE', cmd[1], self.commands(cmd[2]), cmd[3]))
+                self.invalidate_written(table, cmd)
+
+            elif tag == 'REPEAT':
+                body_table = {}
+                body = self.commands(cmd[1], body_table)
+                cond = self.condition(cmd[2], body_table)
+                result.append(('REPEAT', body, cond, cmd[3]))
+                self.invalidate_written(table, cmd)
+
+            elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+                start = self.lookup(cmd[2], table)
+                end = self.lookup(cmd[3], table)
+                result.append((tag, cmd[1], start, end, self.commands(cmd[4]), cmd[5]))
+                self.invalidate_written(table, cmd)
+
+            else:
+                result.append(cmd)
+
+        return result
+
+    def invalidate_written(self, table, node):
+        written = set()
+        written_names(node, self.signatures, written)
+        if any(n[0] == 'CALL' for n in walk_commands(node)):
+            table.clear()
+        else:
+            self.invalidate(table, written)
+
+    def scope(self, declarations, commands, params=()):
+        self.params = {p_name for _, p_name, _ in params}
+        self.temporaries = []
+        commands = self.commands(commands)
+        return list(declarations) + self.temporaries, commands
+
+
+def walk_commands(node):
+    # Wszystkie instrukcje zagnieżdżone w node
+    if isinstance(node, list):
+        for n in node:
+            yield from walk_commands(n)
+        return
+    if not isinstance(node, tuple):
+        return
+    yield node
+    for n in node[1:]:
+        if isinstance(n, list):
+            yield from walk_commands(n)
+
+
+def number_values(ast):
+    numbering = ValueNumbering(procedure_signatures(ast))
+
+    procedures = []
+    for proc in ast[1]:
+        decls, commands = numbering.scope(proc[2], proc[3], proc[1][1])
+        procedures.append(('PROCEDURE', proc[1], decls, commands, proc[4]))
+
+    main = ast[2]
+    decls, commands = numbering.scope(main[1], main[2])
+    return ('PROGRAM_ALL', procedures, ('MAIN', decls, commands, main[3]))
@@ -0,0 +1,143 @@
+"""Usuwanie martwego kodu na drzewie AST.
+
+Procedury, do których nie prowadzi żadne wywołanie z PROGRAM (także pośrednio), oraz
+przypisania do zmiennych, których wartość nie zostanie już odczytana, trafiają do węzła
+DISCARD - generator sprawdza je semantycznie, ale nie emituje dla nich kodu. Żywotność
+zmiennych liczona jest wstecz po drzewie, dla pętli aż do punktu stałego.
+"""
+from licm import names_read
+
+
+def calls(node, found):
+    # Nazwy procedur wywoływanych w node poza martwym kodem
+    if isinstance(node, list):
+        for n in node:
+            calls(n, found)
+        return
+    if not isinstance(node, tuple) or node[0] == 'DISCARD':
+        return
+    if node[0] == 'CALL':
+        found.add(node[1])
+        return
+    for n in node[1:]:
+        calls(n, found)
+
+
+def reachable_procedures(ast):
+    bodies = {proc[1][0]: proc[3] for proc in ast[1]}
+    reached = set()
+    pending = set()
+    calls(ast[2][2], pending)
+    while pending:
+        name = pending.pop()
+        if name in reached or name not in bodies:
+            continue
+        reached.add(name)
+        calls(bodies[name], pending)
+    return reached
+
+
+def condition_reads(cond):
+    return names_read(cond[2]) | names_read(cond[3])
+
+
+class DeadStores:
+    def __init__(self, candidates):
+        # Zmienne, których przypisania wolno usunąć: skalary lokalne, bez parametrów
+        self.candidates = candidates
+
+    def commands(self, commands, live):
+        """Zwraca (instrukcje, zmienne żywe na wejściu); live - zmienne żywe za commands."""
+        result = []
+        for cmd in reversed(commands):
+            cmd, live = self.command(cmd, live)
+            result.append(cmd)
+        result.reverse()
+        return result, live
+
+    def command(self, cmd, live):
+        tag = cmd[0]
+
+        if tag == 'ASSIGN':
+            target = cmd[1]
+            if target[0] == 'ARRAY_ID':
+                return cmd, live | names_read(target[2]) | names_read(cmd[2])
+            if target[1] in self.candidates and target[1] not in live:
+                return ('DISCARD', [cmd], cmd[3]), live
+            return cmd, (live - {target[1]}) | names_read(cmd[2])
+
+        elif tag == 'READ':
+            # Wczytanie zostaje zawsze - zużywa daną z wejścia
+            target = cmd[1]
+            if target[0] == 'ARRAY_ID':
+                return cmd, live | names_read(target[2])
+            return cmd, live - {target[1]}
+
+        elif tag == 'WRITE':
+            return cmd, live | names_read(cmd[1])
+
+        elif tag == 'CALL':
+            # Procedura może odczytać każdy argument
+            return cmd, live | {arg_name for arg_name, _ in cmd[2]}
+
+        elif tag == 'IF':
+            body, body_live = self.commands(cmd[2], live)
+            return ('IF', cmd[1], body, cmd[3]), live | body_live | condition_reads(cmd[1])
+
+        elif tag == 'IF_ELSE':
+            then_body, then_live = self.commands(cmd[2], live)
+            else_body, else_live = self.commands(cmd[3], live)
+            return (('IF_ELSE', cmd[1], then_body, else_body, cmd[4]),
+                    then_live | else_live | condition_reads(cmd[1]))
+
+        elif tag == 'WHILE':
+            # Na początku obrotu: warunek, wyjście z pętli albo kolejny obrót
+            start = live | condition_reads(cmd[1])
+            while True:
+                body, body_live = self.commands(cmd[2], start)
+                new_start = live | condition_reads(cmd[1]) | body_live
+                if new_start == start:
+                    return ('WHILE', cmd[1], body, cmd[3]), start
+                start = new_start
+
+        elif tag == 'REPEAT':
+            # Na końcu obrotu: warunek, wyjście z pętli albo kolejny obrót
+            end = live | condition_reads(cmd[2])
+            while True:
+                body, body_live = self.commands(cmd[1], end)
+                new_end = live | condition_reads(cmd[2]) | body_live
+                if new_end == end:
+                    return ('REPEAT', body, cmd[2], cmd[3]), body_live
+                end = new_end
+
+        elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+            end = live
+            while True:
+                body, body_live = self.commands(cmd[4], end)
+                new_end = live | body_live
+                if new_end == end:
+                    bounds = names_read(cmd[2]) | names_read(cmd[3])
+                    return (tag, cmd[1], cmd[2], cmd[3], body, cmd[5]), end | bounds
+                end = new_end
+
+        return cmd, live
+
+
+def eliminate_dead_code(ast):
+    reached = reachable_procedures(ast)
+
+    procedures = []
+    for proc in ast[1]:
+        decls, commands = proc[2], proc[3]
+        if proc[1][0] not in reached:
+            commands = [('DISCARD', commands, proc[4])]
+        else:
+            # Zmienne lokalne zachowują wartość między wywołaniami, więc są żywe na końcu
+            locals_ = {decl[1] for decl in decls if decl[0] == 'VAR'}
+            commands, _ = DeadStores(locals_).commands(commands, set(locals_))
+        procedures.append(('PROCEDURE', proc[1], decls, commands, proc[4]))
+
+    main = ast[2]
+    variables = {decl[1] for decl in main[1] if decl[0] == 'VAR'}
+    commands, _ = DeadStores(variables).commands(main[2], set())
+    return ('PROGRAM_ALL', procedures, ('MAIN', main[1], commands, main[3]))
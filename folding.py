@@ -0,0 +1,161 @@
+"""Zwijanie stałych i redukcja mocy operacji na drzewie AST.
+
+Przebieg działa między MyParser.parse a CodeGenerator.walk. Gałęzie, które na pewno
+się nie wykonają, trafiają do węzła ('DISCARD', commands, lineno) - generator sprawdza
+je semantycznie, ale nie emituje dla nich kodu.
+"""
+
+# Mnożenie przez stałą o co najwyżej tylu bitach idzie łańcuchem SHL/ADD/SUB
+MULC_MAX_BITS = 32
+
+
+def evaluate(op, a, b):
+    if op == '+':
+        return a + b
+    if op == '-':
+        return max(a - b, 0)
+    if op == '*':
+        return a * b
+    if op == '/':
+        return a // b if b else 0
+    if op == '%':
+        return a % b if b else 0
+    # Operatory wprowadzane przez fold_expression
+    if op == 'SHL':
+        return a << b
+    if op == 'SHR':
+        return a >> b
+    if op == 'AND':
+        return a & b
+    if op == 'MULC':
+        return a * b
+    raise Exception(f"Nieznany operator {op}")
+
+
+def compare(rel_op, a, b):
+    return {
+        '=': a == b,
+        '!=': a != b,
+        '<': a < b,
+        '>': a > b,
+        '<=': a <= b,
+        '>=': a >= b,
+    }[rel_op]
+
+
+def power_of_two(value):
+    # Wykładnik k jeśli value == 2^k, inaczej None
+    if value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
+def fold_expression(node):
+    if node[0] != 'BINARY_OP':
+        return node
+
+    op, left, right, lineno = node[1], node[2], node[3], node[4]
+
+    if left[0] == 'NUM' and right[0] == 'NUM':
+        return ('NUM', str(evaluate(op, int(left[1]), int(right[1]))), lineno)
+
+    # Stała zawsze po prawej stronie działań przemiennych
+    if op in ['+', '*'] and left[0] == 'NUM':
+        left, right = right, left
+
+    if right[0] != 'NUM':
+        return ('BINARY_OP', op, left, right, lineno)
+
+    value = int(right[1])
+    k = power_of_two(value)
+
+    # Tożsamości, które zachowują odczyt zmiennej (a więc i jej kontrolę)
+    if (op in ['+', '-'] and value == 0) or (op in ['*', '/'] and value == 1):
+        return left
+
+    if op == '*' and k is not None:
+        return ('BINARY_OP', 'SHL', left, ('NUM', str(k), lineno), lineno)
+    if op == '/' and k is not None:
+        return ('BINARY_OP', 'SHR', left, ('NUM', str(k), lineno), lineno)
+    if op == '%' and k is not None:
+        return ('BINARY_OP', 'AND', left, ('NUM', str(value - 1), lineno), lineno)
+    if op == '*' and 0 < value.bit_length() <= MULC_MAX_BITS:
+        return ('BINARY_OP', 'MULC', left, right, lineno)
+
+    return ('BINARY_OP', op, left, right, lineno)
+
+
+def fold_condition(node):
+    # True/False dla warunku o stałej wartości, inaczej None
+    left, right = node[2], node[3]
+    if left[0] == 'NUM' and right[0] == 'NUM':
+        return compare(node[1], int(left[1]), int(right[1]))
+    return None
+
+
+def fold_commands(commands):
+    result = []
+    for cmd in commands:
+        result.extend(fold_command(cmd))
+    return result
+
+
+def fold_command(node):
+    # Zwraca listę instrukcji zastępujących node
+    tag = node[0]
+
+    if tag == 'ASSIGN':
+        return [('ASSIGN', node[1], fold_expression(node[2]), node[3])]
+
+    elif tag == 'IF':
+        value = fold_condition(node[1])
+        body = fold_commands(node[2])
+        if value is True:
+            return body
+        if value is False:
+            return [('DISCARD', body, node[-1])]
+        return [('IF', node[1], body, node[3])]
+
+    elif tag == 'IF_ELSE':
+        value = fold_condition(node[1])
+        then_body = fold_commands(node[2])
+        else_body = fold_commands(node[3])
+        if value is True:
+            return then_body + [('DISCARD', else_body, node[-1])]
+        if value is False:
+            return [('DISCARD', then_body, node[-1])] + else_body
+        return [('IF_ELSE', node[1], then_body, else_body, node[4])]
+
+    elif tag == 'WHILE':
+        body = fold_commands(node[2])
+        if fold_condition(node[1]) is False:
+            return [('DISCARD', body, node[-1])]
+        return [('WHILE', node[1], body, node[3])]
+
+    elif tag == 'REPEAT':
+        body = fold_commands(node[1])
+        if fold_condition(node[2]) is True:
+            return body
+        return [('REPEAT', body, node[2], node[3])]
+
+    elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+        body = fold_commands(node[4])
+        start, end = node[2], node[3]
+        loop = (tag, node[1], start, end, body, node[5])
+        if start[0] == 'NUM' and end[0] == 'NUM':
+            first, last = int(start[1]), int(end[1])
+            if (tag == 'FOR_TO' and first > last) or (tag == 'FOR_DOWNTO' and first < last):
+                return [('DISCARD', [loop], node[-1])]
+        return [loop]
+
+    return [node]
+
+
+def fold_constants(ast):
+    procedures = []
+    for proc in ast[1]:
+        procedures.append(('PROCEDURE', proc[1], proc[2], fold_commands(proc[3]), proc[4]))
+
+    main = ast[2]
+    main = ('MAIN', main[1], fold_commands(main[2]), main[3])
+    return ('PROGRAM_ALL', procedures, main)
@@ -1,4 +1,7 @@
 from platform import node
+from constants import synthesize
+from ir import (Label, Instruction, label_addresses, READ, WRITE, LOAD, STORE, RLOAD, RSTORE, ADD, SUB, SWP,
+                RST, INC, DEC, SHL, SHR, JUMP, JPOS, JZERO, CALL, RTRN, HALT)
 
 
 class SymbolTable:
@@ -8,16 +11,35 @@ class SymbolTable:
         self.procedures = {}
         self.current_scope = "MAIN"
         self.next_address = 0
+        # (zasięg, nazwa) -> adres ustalony przez memory_layout.plan_memory
+        self.layout = {}
+        # Komórki zwolnione po pętlach FOR, osobno dla każdego zasięgu
+        self.free_slots = {}
+        self.hidden_count = 0
 
     def is_iterator(self, name):
         return name in self.iterators
 
     def remove_variable(self, name):
         if name in self.variables:
-            del self.variables[name]
+            var = self.variables.pop(name)
+            self.free_slots.setdefault(self.current_scope, []).append(var['address'])
         if name in self.iterators:
             self.iterators.remove(name)
 
+    def allocate(self, name, size=1):
+        address = self.layout.get((self.current_scope, name))
+        if address is not None:
+            return address
+
+        free = self.free_slots.get(self.current_scope)
+        if size == 1 and free:
+            return free.pop()
+
+        address = self.next_address
+        self.next_address += size
+        return address
+
     @property
     def variables(self):
         """Zwraca słownik zmiennych dla aktualnego zasięgu (MAIN lub procedura)"""
@@ -39,13 +61,12 @@ class SymbolTable:
             is_initialized = True
         
         self.variables[name] = {
-            'address': self.next_address,
+            'address': self.allocate(name),
             'is_param': is_param,
             'p_type': p_type,
             'initialized': is_initialized,
             'type': 'VAR'
         }
-        self.next_address += 1
 
     def get_address(self, name, lineno):
         if name not in self.variables:
@@ -62,28 +83,28 @@ class SymbolTable:
         if name in self.variables:
             raise Exception(f"Błąd w linii {lineno}: Druga deklaracja {name}")
         
-        offset = self.next_address - first
-        
+        # Offset (adres - first) musi być liczbą naturalną
+        if not is_param and (self.current_scope, name) not in self.layout and self.next_address < first:
+            self.next_address = first
+
+        address = self.allocate(name, 1 if is_param else last - first + 1)
+
         self.variables[name] = {
             'type': 'ARRAY',
             'first': first,
             'last': last,
-            'offset': self.next_address - first,
+            'offset': address - first,
             'is_param': is_param,
             'p_type': p_type,
             'initialized': True,
-            'address': self.next_address
+            'address': address
         }
-
-        if is_param:
-            self.next_address += 1
-        else:
-            self.next_address += (last - first + 1)
         
     def declare_hidden_variable(self):
-        name = f"__hidden_{self.next_address}"
+        self.hidden_count += 1
+        name = f"__hidden_{self.hidden_count}"
         self.declare_variable(name, 0, is_param=False, p_type='Iterator')
-        return self.variables[name]['address']
+        return name
     
     def declare_procedure(self, name, params, lineno):
         if name in self.procedures:
@@ -95,7 +116,7 @@ class SymbolTable:
         self.procedures[name] = {
             'params': params,
             'locals': {},
-            'start_address': None,
+            'label': Label(name),
             'return_address_ptr': ret_ptr
         }
         
@@ -111,34 +132,309 @@ class SymbolTable:
                 raise Exception(f"Błąd w linii {p_line}: Nieznany typ parametru {p_type}")
 
     
+# Od tylu dzieleń w programie dzielenie jest emitowane raz jako podprogram
+DIV_ROUTINE_THRESHOLD = 4
+
+
+# Zasięg rozkazów podprogramu dzielenia (nazwy procedur nie mogą zawierać nawiasów)
+DIVISION_SCOPE = '(dzielenie)'
+
+
+# Dodawanie/odejmowanie stałej do tej wartości idzie przez INC/DEC
+INC_CHAIN_LIMIT = 8
+
+
+def multiplication_chain(value):
+    # Cyfry (1, 0, -1) od najstarszej: tańszy z zapisu binarnego i NAF
+    binary = [int(bit) for bit in bin(value)[2:]]
+
+    naf = []
+    n = value
+    while n:
+        if n % 2:
+            digit = 2 - n % 4
+            n -= digit
+        else:
+            digit = 0
+        naf.append(digit)
+        n //= 2
+    naf.reverse()
+
+    def cost(digits):
+        return len(digits) - 1 + 5 * sum(1 for d in digits[1:] if d)
+
+    return naf if cost(naf) < cost(binary) else binary
+
+
+# Rejestry, które nie są roboczymi dla emitowanych sekwencji i mogą trzymać zmienne
+ALLOCATABLE_REGISTERS = ['c', 'd', 'e', 'f']
+
+# Rejestry niszczone przez mnożenie i dzielenie
+MULTIPLICATION_REGISTERS = {'c', 'd'}
+DIVISION_REGISTERS = {'c', 'd', 'e'}
+
+# Mnożnik wagi użycia zmiennej na każdy poziom zagnieżdżenia pętli
+LOOP_WEIGHT = 8
+
+# Skopiowanie parametru na wejściu lub wyjściu procedury kosztuje tyle co tyle odwołań przez wskaźnik
+PARAM_COPY_WEIGHT = 3
+
+
+def clobbered_registers(node):
+    # Rejestry spoza roboczych a/b/g/h, które niszczy kod dla node
+    if isinstance(node, list):
+        result = set()
+        for n in node:
+            result |= clobbered_registers(n)
+        return result
+    if not isinstance(node, tuple):
+        return set()
+    result = set()
+    if node[0] == 'BINARY_OP':
+        if node[1] == '*':
+            result |= MULTIPLICATION_REGISTERS
+        elif node[1] in ['/', '%']:
+            result |= DIVISION_REGISTERS
+    for n in node[1:]:
+        result |= clobbered_registers(n)
+    return result
+
+
+def count_uses(node, uses, written, weight=1):
+    # Ważona liczba odwołań do zmiennych skalarnych; written - zmienne modyfikowane
+    if isinstance(node, list):
+        for n in node:
+            count_uses(n, uses, written, weight)
+        return
+    if not isinstance(node, tuple):
+        return
+
+    tag = node[0]
+    if tag == 'ID':
+        uses[node[1]] = uses.get(node[1], 0) + weight
+        return
+    if tag in ['ASSIGN', 'READ'] and node[1][0] == 'ID':
+        written.add(node[1][1])
+    if tag == 'CALL':
+        return
+    if tag in ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']:
+        weight *= LOOP_WEIGHT
+
+    for n in node[1:]:
+        count_uses(n, uses, written, weight)
+
+
+def count_element_uses(node, iterator, uses, weight=1):
+    # Ważona liczba odwołań t[iterator] dla każdej tablicy t
+    if isinstance(node, list):
+        for n in node:
+            count_element_uses(n, iterator, uses, weight)
+        return
+    if not isinstance(node, tuple):
+        return
+
+    tag = node[0]
+    if tag == 'ARRAY_ID' and node[2][0] == 'ID' and node[2][1] == iterator:
+        uses[node[1]] = uses.get(node[1], 0) + weight
+        return
+    if tag in ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']:
+        weight *= LOOP_WEIGHT
+
+    for n in node[1:]:
+        count_element_uses(n, iterator, uses, weight)
+
+
+def count_array_uses(node, uses, skip=(), weight=1):
+    # Ważona liczba odwołań do elementów każdej tablicy, bez par (tablica, iterator) z skip
+    if isinstance(node, list):
+        for n in node:
+            count_array_uses(n, uses, skip, weight)
+        return
+    if not isinstance(node, tuple):
+        return
+
+    tag = node[0]
+    if tag == 'ARRAY_ID':
+        if not (node[2][0] == 'ID' and (node[1], node[2][1]) in skip):
+            uses[node[1]] = uses.get(node[1], 0) + weight
+        return
+    if tag == 'CALL':
+        return
+    if tag in ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']:
+        weight *= LOOP_WEIGHT
+
+    for n in node[1:]:
+        count_array_uses(n, uses, skip, weight)
+
+
+def count_calls(node, weight=1):
+    # Ważona liczba wywołań procedur - przy każdym rejestry są zrzucane do pamięci
+    if isinstance(node, list):
+        return sum(count_calls(n, weight) for n in node)
+    if not isinstance(node, tuple):
+        return 0
+    if node[0] == 'CALL':
+        return weight
+    if node[0] in ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']:
+        weight *= LOOP_WEIGHT
+    return sum(count_calls(n, weight) for n in node[1:])
+
+
+def call_nodes(node):
+    # Wszystkie węzły CALL w node
+    if isinstance(node, list):
+        for n in node:
+            yield from call_nodes(n)
+        return
+    if not isinstance(node, tuple):
+        return
+    if node[0] == 'CALL':
+        yield node
+        return
+    for n in node[1:]:
+        yield from call_nodes(n)
+
+
+def parameter_aliases(procedures, main):
+    # nazwa procedury -> pary parametrów, które mogą wskazywać tę samą zmienną
+    params = {proc[1][0]: [p_name for _, p_name, _ in proc[1][1]] for proc in procedures}
+    aliases = {name: set() for name in params}
+    scopes = [(proc[1][0], proc[3]) for proc in procedures] + [('MAIN', main[2])]
+
+    # Para argumentów wywołania może być aliasem także wtedy, gdy są nimi parametry wołającego
+    changed = True
+    while changed:
+        changed = False
+        for scope, commands in scopes:
+            for call in call_nodes(commands):
+                names = params.get(call[1])
+                if names is None:
+                    continue
+                args = [arg_name for arg_name, _ in call[2]][:len(names)]
+                for i in range(len(args)):
+                    for j in range(i + 1, len(args)):
+                        if args[i] != args[j] and frozenset((args[i], args[j])) not in aliases.get(scope, ()):
+                            continue
+                        pair = frozenset((names[i], names[j]))
+                        if pair not in aliases[call[1]]:
+                            aliases[call[1]].add(pair)
+                            changed = True
+    return aliases
+
+
+def assigned_before_use(commands, name):
+    # Czy pierwsza instrukcja, która dotyka name, nadaje jej wartość bez odczytu
+    for cmd in commands:
+        if cmd[0] in ['ASSIGN', 'READ'] and cmd[1][0] == 'ID' and cmd[1][1] == name:
+            uses = {}
+            if cmd[0] == 'ASSIGN':
+                count_uses(cmd[2], uses, set())
+            return name not in uses
+        if cmd[0] in ['CALL', 'INLINED'] and name in [arg_name for arg_name, _ in cmd[2]]:
+            return False
+        uses = {}
+        count_uses(cmd, uses, set())
+        if name in uses:
+            return False
+    return False
+
+
+def value_key(node):
+    # Postać wartości bez numerów linii, do porównywania operandów
+    if node[0] == 'NUM':
+        return ('NUM', int(node[1]))
+    if node[0] == 'ID':
+        return ('ID', node[1])
+    return ('ARRAY_ID', node[1], value_key(node[2]))
+
+
+def count_divisions(node):
+    # Dzielenia, dla których powstanie kod - bez martwego kodu w DISCARD
+    if isinstance(node, list):
+        return sum(count_divisions(n) for n in node)
+    if not isinstance(node, tuple) or node[0] == 'DISCARD':
+        return 0
+    count = 1 if node[0] == 'BINARY_OP' and node[1] in ['/', '%'] else 0
+    return count + sum(count_divisions(n) for n in node[1:])
+
+
 class CodeGenerator:
-    def __init__(self):
+    def __init__(self, div_routine=None, layout=None, profile=None):
       self.symbols = SymbolTable()
-      self.calls_to_patch = []
+      # Wykonania instrukcji z poprzedniego uruchomienia, patrz profile_data.py
+      self.profile = profile
+      if layout is not None:
+          self.symbols.layout, self.symbols.next_address = layout
       self.instructions = []
-      self.symbols.declare_variable("__tmp1", 0)
-      self.symbols.declare_variable("__tmp2", 0)
-      self.symbols.declare_variable("__mult_a", 0)
-      self.symbols.declare_variable("__mult_b", 0)
-      self.symbols.declare_variable("__mult_res", 0)
-      self.symbols.declare_variable("__div_a", 0)
-      self.symbols.declare_variable("__div_b", 0)
-      self.symbols.declare_variable("__div_res", 0)
-      self.symbols.declare_variable("__div_m", 0) 
-
-    def emit(self, instr):
-      self.instructions.append(instr)
+      self.div_routine = div_routine
+      self.div_label = Label('div')
+      # Adres podprogramu dzielenia w ostatecznym kodzie, patrz locate_procedures
+      self.div_address = None
+      self.keep_division = False
+      self.division_ready = None
+      self.free_registers = list(ALLOCATABLE_REGISTERS)
+      self.pinned = []
+      # (tablica, iterator) -> rejestr z adresem elementu tablica[iterator]
+      self.element_registers = {}
+      # Rejestr -> wartość znana w bieżącym bloku podstawowym
+      self.known = {}
+      # nazwa procedury -> pary parametrów, które mogą być aliasami
+      self.aliases = {}
+      # Miejsce w źródle dla emitowanych rozkazów, patrz ir.Instruction
+      self.scope = None
+      self.frames = []
+      self.statements = [None]
+      self.statement_count = 0
+
+    def emit(self, op, arg=None):
+        self.instructions.append(Instruction(op, arg, self.scope, tuple(self.frames), self.statements[-1]))
+        self.track(op, arg)
+
+    def locate_procedures(self):
+        # Adresy wejścia procedur w ostatecznym kodzie; None dla procedur usuniętych jako nieosiągalne
+        addresses = label_addresses(self.instructions)
+        for proc_info in self.symbols.procedures.values():
+            proc_info['start_address'] = addresses.get(proc_info['label'])
+        self.div_address = addresses.get(self.div_label)
+
+    def place(self, label):
+        # Do etykiety można doskoczyć z innym stanem rejestrów
+        self.instructions.append(label)
+        self.known = {}
+
+    def track(self, op, arg):
+        known = self.known
+        if op == RST:
+            known[arg] = 0
+        elif op in (INC, DEC, SHL, SHR):
+            if arg in known:
+                value = known[arg]
+                known[arg] = {INC: value + 1, DEC: max(value - 1, 0), SHL: 2 * value, SHR: value // 2}[op]
+        elif op in (ADD, SUB):
+            if 'a' in known and arg in known:
+                a, x = known['a'], known[arg]
+                known['a'] = a + x if op == ADD else max(a - x, 0)
+            else:
+                known.pop('a', None)
+        elif op == SWP:
+            a, x = known.pop('a', None), known.pop(arg, None)
+            if x is not None:
+                known['a'] = x
+            if a is not None:
+                known[arg] = a
+        elif op in (LOAD, RLOAD, READ):
+            known.pop('a', None)
+        elif op == JPOS:
+            # Dalej idziemy tylko przy ra == 0
+            known['a'] = 0
+        elif op in (CALL, JUMP, RTRN, HALT):
+            self.known = {}
 
     def generate_constant(self, value):
-        value = int(value)
-        self.emit("RST a")
-        if value == 0: return
-        
-        binary = bin(value)[2:]
-        for bit in binary:
-            self.emit("SHL a")
-            if bit == '1':
-                self.emit("INC a")
+        # ra = value najtańszą drogą, z użyciem znanych wartości rejestrów
+        _, steps = synthesize(int(value), tuple(sorted(self.known.items())))
+        for op, arg in steps:
+            self.emit(op, arg)
 
     def walk(self, node):
         tag = node[0]
@@ -147,32 +443,43 @@ class CodeGenerator:
             procedures = node[1]
             main = node[2]
             for reg in ['a','b','c','d','e','f','g','h']:
-                self.emit(f"RST {reg}") 
+                self.emit(RST, reg)
 
             # Rejestracja nazw procedur w SymbolTable
             for proc in procedures:
                 name, params = proc[1]
                 self.symbols.declare_procedure(name, params, proc[4])
 
+            self.aliases = parameter_aliases(procedures, main)
+
             #Skok do Main
-            jump_main_idx = len(self.instructions)
-            self.emit("JUMP placeholder")
+            main_label = Label('main')
+            self.emit(JUMP, main_label)
+
+            #Podprogram dzielenia: wejście rc / rb, wynik rd - iloraz, rc - reszta
+            if self.div_routine is None:
+                self.div_routine = count_divisions(node) >= DIV_ROUTINE_THRESHOLD
+            if self.div_routine:
+                self.scope = DIVISION_SCOPE
+                self.place(self.div_label)
+                self.emit(SWP, 'h')
+                self.generate_division()
+                self.emit(SWP, 'h')
+                self.emit(RTRN)
+                self.scope = None
 
             #Generowanie kodu procedur
             for proc in procedures:
                 self.walk(proc)
 
-            #Powrót do skoku do Main
-            self.instructions[jump_main_idx] = f"JUMP {len(self.instructions)}"
-            
             #Generowanie Main
+            self.place(main_label)
+            self.scope = 'MAIN'
+            self.frames = [('MAIN', main[3])]
             self.walk(main)
-            self.emit("HALT")
-
-            #wypełnianie CALL placehloder
-            for instr_idx, proc_name in self.calls_to_patch:
-                real_addr = self.symbols.procedures[proc_name]['start_address']
-                self.instructions[instr_idx] = f"CALL {real_addr}"
+            self.emit(HALT)
+            self.scope = None
+            self.frames = []
 
         elif tag == 'MAIN':
             declarations = node[1]
@@ -187,8 +494,7 @@ class CodeGenerator:
                 elif type_decl == 'ARRAY':
                     self.symbols.declare_array(decl[1], int(decl[2]), int(decl[3]), decl[4])
 
-            for cmd in commands:
-                self.walk(cmd)
+            self.walk_commands(commands)
 
         elif tag == 'NUM':
             # node: ('NUM', value, lineno)
@@ -212,9 +518,8 @@ class CodeGenerator:
                     var['initialized'] = True
 
 
-            addr = self.symbols.get_address(name, lineno)
-            self.emit("READ")
-            self.emit(f"STORE {addr}")
+            self.emit(READ)
+            self.generate_store(node[1])
 
             var = self.symbols.variables.get(name)
             if var:
@@ -234,10 +539,9 @@ class CodeGenerator:
                 elif var and not var.get('initialized'):
                     raise Exception(f"Błąd w linii {lineno}: Próba wypisania (WRITE) niezainicjalizowanej zmiennej '{val_node[1]}'")
                 
-                self.generate_address_to_rb(val_node)
-                self.emit("RLOAD b")
+                self.generate_load(val_node)
             
-            self.emit("WRITE")
+            self.emit(WRITE)
 
         elif tag == 'ASSIGN':
             target_id = node[1] # ('ID', name, lineno) or ('ARRAY_ID', name, index, lineno)
@@ -258,10 +562,7 @@ class CodeGenerator:
                 raise Exception(f"Błąd: Próba modyfikacji iteratora {name}")
 
             self.walk(node[2]) 
-            self.emit("SWP g") 
-            self.generate_address_to_rb(node[1]) 
-            self.emit("SWP g") 
-            self.emit("RSTORE b")
+            self.generate_store(node[1])
 
             if var:
                 var['initialized'] = True
@@ -269,152 +570,45 @@ class CodeGenerator:
         elif tag == 'BINARY_OP':
             op = node[1]
 
-            self.walk(node[2]) 
-            self.emit("SWP g")
+            # Iloraz i reszta z poprzedniej instrukcji wciąż są w rd i rc
+            shared = self.division_ready == (value_key(node[2]), value_key(node[3]))
+            self.division_ready = None
 
-            self.walk(node[3]) 
-            self.emit("SWP b")
-            self.emit("SWP g")
+            if op in ['SHL', 'SHR', 'AND', 'MULC'] or (
+                    op in ['+', '-'] and node[3][0] == 'NUM' and int(node[3][1]) <= INC_CHAIN_LIMIT):
+                self.walk(node[2])
+                self.generate_constant_operation(op, int(node[3][1]))
+                return
+
+            if not shared:
+                self.walk(node[2]) 
+                self.emit(SWP, 'g')
+
+                self.walk(node[3]) 
+                self.emit(SWP, 'b')
+                self.emit(SWP, 'g')
 
             if op == '+':
-                self.emit("ADD b")
+                self.emit(ADD, 'b')
             elif op == '-':
-                self.emit("SUB b")
+                self.emit(SUB, 'b')
             elif op == '*':
-                m_a = self.symbols.get_address("__mult_a", 0)
-                m_b = self.symbols.get_address("__mult_b", 0)
-                res = self.symbols.get_address("__mult_res", 0)
-
-                self.emit(f"STORE {m_a}")
-                self.emit("SWP b") 
-                self.emit(f"STORE {m_b}")
-                
-                self.emit("RST a")
-                self.emit(f"STORE {res}")
-
-                start_mult = len(self.instructions)
-                self.emit(f"LOAD {m_b}")
-                jump_out = len(self.instructions)
-                self.emit("JZERO ???") 
-
-                self.emit("SHR a")
-                self.emit("SHL a")
-                self.emit("SWP b")
-                self.emit(f"LOAD {m_b}")
-                self.emit("SUB b")
-                
-                jump_skip_add = len(self.instructions)
-                self.emit("JZERO ???") 
-                
-                self.emit(f"LOAD {res}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {m_a}")
-                self.emit("ADD b")
-                self.emit(f"STORE {res}")
-
-                target_skip = len(self.instructions)
-                self.instructions[jump_skip_add] = f"JZERO {target_skip}"
-                self.emit(f"LOAD {m_a}")
-                self.emit("SHL a")
-                self.emit(f"STORE {m_a}")
-                self.emit(f"LOAD {m_b}")
-                self.emit("SHR a")
-                self.emit(f"STORE {m_b}")
-                self.emit(f"JUMP {start_mult}")
-                
-                self.instructions[jump_out] = f"JZERO {len(self.instructions)}"
-                self.emit(f"LOAD {res}")
+                self.generate_multiplication()
 
             elif op in ['/', '%']:
-                d_a = self.symbols.get_address("__div_a", 0)
-                d_b = self.symbols.get_address("__div_b", 0)
-                d_res = self.symbols.get_address("__div_res", 0)
-                d_m = self.symbols.get_address("__div_m", 0)
-
-                self.emit(f"STORE {d_a}")
-                self.emit("SWP b")
-                self.emit(f"STORE {d_b}")
-
-                self.emit(f"LOAD {d_b}")
-                jump_div_zero = len(self.instructions)
-                self.emit("JZERO ???")
-
-                self.emit("RST a")
-                self.emit(f"STORE {d_res}")
-                self.emit("INC a")
-                self.emit(f"STORE {d_m}")
-
-                loop_shl_start = len(self.instructions)
-                self.emit(f"LOAD {d_a}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {d_b}")
-                self.emit("SHL a")
-                self.emit("SUB b") 
-                
-                jump_shl_end = len(self.instructions)
-                self.emit("JPOS ???")
-
-                self.emit(f"LOAD {d_b}")
-                self.emit("SHL a")
-                self.emit(f"STORE {d_b}")
-                self.emit(f"LOAD {d_m}")
-                self.emit("SHL a")
-                self.emit(f"STORE {d_m}")
-                self.emit(f"JUMP {loop_shl_start}")
-                
-                self.instructions[jump_shl_end] = f"JPOS {len(self.instructions)}"
-
-                loop_main_start = len(self.instructions)
-                self.emit(f"LOAD {d_m}")
-                jump_main_end = len(self.instructions)
-                self.emit("JZERO ???") 
-
-                self.emit(f"LOAD {d_a}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {d_b}")
-                self.emit("SUB b") 
-                
-                jump_skip_sub = len(self.instructions)
-                self.emit("JPOS ???") 
-
-                self.emit(f"LOAD {d_a}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {d_b}")
-                self.emit("SWP b")
-                self.emit("SUB b")
-                self.emit(f"STORE {d_a}")
-                
-                self.emit(f"LOAD {d_res}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {d_m}")
-                self.emit("ADD b")
-                self.emit(f"STORE {d_res}")
-
-                target_skip_sub = len(self.instructions)
-                self.instructions[jump_skip_sub] = f"JPOS {target_skip_sub}"
-                self.emit(f"LOAD {d_b}")
-                self.emit("SHR a")
-                self.emit(f"STORE {d_b}")
-                self.emit(f"LOAD {d_m}")
-                self.emit("SHR a")
-                self.emit(f"STORE {d_m}")
-                self.emit(f"JUMP {loop_main_start}")
-
-                self.instructions[jump_main_end] = f"JZERO {len(self.instructions)}"
-                
-                if op == '/':
-                    self.emit(f"LOAD {d_res}")
-                else: # %
-                    self.emit(f"LOAD {d_a}")
-
-                jump_after_all = len(self.instructions)
-                self.emit("JUMP ???")
-                
-                target_div_zero = len(self.instructions)
-                self.instructions[jump_div_zero] = f"JZERO {target_div_zero}"
-                self.emit("RST a") 
-                
-                self.instructions[jump_after_all] = f"JUMP {len(self.instructions)}"
+                if not shared:
+                    self.emit(SWP, 'c')
+                    if self.div_routine:
+                        self.emit(CALL, self.div_label)
+                    else:
+                        self.generate_division()
+
+                result = 'd' if op == '/' else 'c'
+                if self.keep_division:
+                    self.emit(RST, 'a')
+                    self.emit(ADD, result)
+                else:
+                    self.emit(SWP, result)
 
         elif tag == 'ID' or tag == 'ARRAY_ID':
             name = node[1]
@@ -427,61 +621,78 @@ class CodeGenerator:
             elif var and not var.get('initialized'):
                 raise Exception(f"Błąd w linii {lineno}: Zmienna '{name}' jest używana, zanim przypisano jej wartość.")
             
-            self.generate_address_to_rb(node)
-            self.emit("RLOAD b")
+            self.generate_load(node)
 
         elif tag == 'IF':
-            self.walk_condition(node[1])
-            jump_idx = len(self.instructions)
-            self.emit("JZERO ???")
-            for cmd in node[2]:
-                self.walk(cmd)
-            self.instructions[jump_idx] = f"JZERO {len(self.instructions)}"
+            end = Label()
+            self.walk_condition(node[1], end)
+            self.walk_commands(node[2])
+            self.place(end)
+
+        elif tag == 'IF_ELSE' and self.then_is_hotter(node):
+            # Częstsza według profilu gałąź then idzie na końcu i nie płaci skoku do end
+            then_label = Label()
+            end = Label()
+            self.walk_condition(node[1], then_label, jump_if=True)
+
+            # Kontrola semantyczna w kolejności źródła: then jest przechodzone pierwsze,
+            # a jego kod odkładany; od etykiety nie zakłada znanych wartości rejestrów
+            known = dict(self.known)
+            mark = len(self.instructions)
+            self.place(then_label)
+            self.walk_commands(node[2])
+            then_code = self.instructions[mark:]
+            del self.instructions[mark:]
+            self.known = known
+
+            self.walk_commands(node[3])
+            self.emit(JUMP, end)
+            self.instructions.extend(then_code)
+            self.place(end)
 
         elif tag == 'IF_ELSE':
+            else_label = Label()
+            end = Label()
 
-            self.walk_condition(node[1])
-            
-            jump_to_else_idx = len(self.instructions)
-            self.emit("JZERO ???")
+            self.walk_condition(node[1], else_label)
             
-            for cmd in node[2]:
-                self.walk(cmd)
+            self.walk_commands(node[2])
             
-            jump_to_end_idx = len(self.instructions)
-            self.emit("JUMP ???")
+            self.emit(JUMP, end)
             
-            self.instructions[jump_to_else_idx] = f"JZERO {len(self.instructions)}"
+            self.place(else_label)
             
-            for cmd in node[3]:
-                self.walk(cmd)
+            self.walk_commands(node[3])
             
-            self.instructions[jump_to_end_idx] = f"JUMP {len(self.instructions)}"
+            self.place(end)
 
         elif tag == 'WHILE':
-            start_addr = len(self.instructions)
-            self.walk_condition(node[1])
-            jump_out_idx = len(self.instructions)
+            pins = self.allocate_loop_registers(node)
 
-            self.emit("JZERO ???") 
-            for cmd in node[2]:
-                self.walk(cmd)
+            # Warunek przed pętlą i na końcu obrotu - jeden skok na obrót zamiast dwóch
+            start = Label()
+            end = Label()
+            self.walk_condition(node[1], end)
 
-            self.emit(f"JUMP {start_addr}")
-            self.instructions[jump_out_idx] = f"JZERO {len(self.instructions)}"
+            self.place(start)
+            self.walk_commands(node[2])
+
+            self.walk_condition(node[1], start, jump_if=True)
+            self.place(end)
+
+            self.release_registers(pins)
 
         elif tag == 'REPEAT':
-            start_address = len(self.instructions)
-            
-            for cmd in node[1]:
-                self.walk(cmd)
+            pins = self.allocate_loop_registers(node)
 
-            self.walk_condition(node[2])
+            start = Label()
+            self.place(start)
             
-            self.emit(f"JZERO {start_address}")
+            self.walk_commands(node[1])
+
+            self.walk_condition(node[2], start)
 
-        elif tag == 'CONDITION':
-          self.walk_condition(node)
+            self.release_registers(pins)
 
         elif tag in ['FOR_TO', 'FOR_DOWNTO']:
             #(tag, iterator_name, start_expr, end_expr, commands, lineno)
@@ -494,59 +705,87 @@ class CodeGenerator:
             self.symbols.declare_variable(it_name, lineno, p_type='Iterator')
             self.symbols.iterators.add(it_name)
             
-            it_addr = self.symbols.get_address(it_name, lineno)
-            limit_addr = self.symbols.declare_hidden_variable()
+            iterator = self.symbols.variables[it_name]
+            # Ukryta zmienna trzyma liczbę pozostałych obrotów pętli
+            counter_name = self.symbols.declare_hidden_variable()
+            counter = self.symbols.variables[counter_name]
 
-            self.walk(start_expr)
-            self.emit(f"STORE {it_addr}")
-            self.walk(end_expr)
-            self.emit(f"STORE {limit_addr}")
+            # Iterator i licznik dostają rejestry w pierwszej kolejności
+            loop_pins = self.pin_variables([iterator, counter], clobbered_registers(commands))
 
-            start_loop_addr = len(self.instructions)
+            self.walk(start_expr)
+            self.store_variable(iterator)
 
+            # Liczba obrotów: TO - (end + 1) - start, DOWNTO - (start + 1) - end
+            self.walk(end_expr)
             if tag == 'FOR_TO':
-                self.emit(f"LOAD {limit_addr}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {it_addr}")
-                self.emit("SUB b")
+                self.emit(INC, 'a')
+                self.subtract_variable(iterator)
             else:
-                self.emit(f"LOAD {it_addr}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {limit_addr}")
-                self.emit("SUB b")
-
-            jump_out_idx = len(self.instructions)
-            self.emit("JPOS ???")
+                self.emit(SWP, 'b')
+                self.load_variable(iterator)
+                self.emit(INC, 'a')
+                self.emit(SUB, 'b')
+            self.store_variable(counter)
+
+            element_pins = self.allocate_element_registers(node, iterator)
+            pins = self.allocate_loop_registers(node)
+
+            # Licznik sprawdzany przed pętlą i na końcu obrotu; na starcie obrotu ra = licznik
+            start = Label()
+            end = Label()
+            self.load_variable(counter)
+            self.emit(JZERO, end)
+
+            self.place(start)
+            if counter.get('register'):
+                self.emit(DEC, counter['register'])
+            else:
+                self.emit(DEC, 'a')
+                self.store_variable(counter)
 
-            for cmd in commands:
-                self.walk(cmd)
+            self.walk_commands(commands)
 
-            self.emit(f"LOAD {it_addr}")
-            if tag == 'FOR_TO':
-                self.emit("INC a")
-                self.emit(f"STORE {it_addr}")
-                self.emit(f"JUMP {start_loop_addr}")
+            step = INC if tag == 'FOR_TO' else DEC
+            if iterator.get('register'):
+                self.emit(step, iterator['register'])
             else:
-                jump_stop_idx = len(self.instructions)
-                self.emit("JZERO ???") 
-                
-                self.emit("DEC a")
-                self.emit(f"STORE {it_addr}")
-                self.emit(f"JUMP {start_loop_addr}")
-                
-                self.instructions[jump_stop_idx] = f"JZERO {len(self.instructions)}"
+                self.load_variable(iterator)
+                self.emit(step, 'a')
+                self.store_variable(iterator)
+            for pin in element_pins:
+                self.emit(step, pin['register'])
+            self.load_variable(counter)
+            self.emit(JPOS, start)
+
+            self.place(end)
 
-            self.instructions[jump_out_idx] = f"JPOS {len(self.instructions)}"
+            self.release_registers(pins)
+            self.release_element_registers(element_pins, it_name)
+            self.release_registers(loop_pins, write_back=False)
 
             self.symbols.remove_variable(it_name)
+            self.symbols.remove_variable(counter_name)
+
+        elif tag == 'DISCARD':
+            # Martwy kod: tylko kontrola semantyczna, bez emisji instrukcji
+            mark = len(self.instructions)
+            known = dict(self.known)
+            self.walk_commands(node[1])
+            del self.instructions[mark:]
+            self.known = known
 
         elif tag == 'CALL':
             self.walk_call(node)
 
+        elif tag == 'INLINED':
+            # Ciało procedury wstawione przez inline.py następuje zaraz po tym węźle
+            self.check_call(node)
+
         elif tag == 'PROCEDURE':
             self.walk_procedure(node)
 
-    def generate_address_to_rb(self, id_node):
+    def check_identifier(self, id_node):
         tag = id_node[0]
         name = id_node[1]
         lineno = id_node[-1]
@@ -559,22 +798,88 @@ class CodeGenerator:
         if tag == 'ARRAY_ID' and var['type'] == 'VAR':
             raise Exception(f"Błąd w linii {lineno}: Niewłaściwe użycie zmiennej '{name}' jako tablicy")
 
-        if tag == 'ARRAY_ID':
+        # Zakres tablicy przekazanej jako T nie jest znany w procedurze
+        if tag == 'ARRAY_ID' and not var.get('is_param', False):
             index_node = id_node[2]
             if index_node[0] == 'NUM':
                 idx_val = int(index_node[1])
                 if idx_val < var['first'] or idx_val > var['last']:
                     raise Exception(f"Błąd w linii {lineno}: Indeks {idx_val} poza zakresem tablicy {name}({var['first']}:{var['last']})")
 
-        var = self.symbols.variables[name]
+        return var
+
+    def direct_address(self, id_node):
+        """Adres komórki znany w czasie kompilacji (zmienna lub tablica ze stałym indeksem), inaczej None"""
+        var = self.check_identifier(id_node)
+
+        if var.get('is_param', False):
+            return None
+
+        if id_node[0] == 'ID':
+            return var['address']
+
+        index_node = id_node[2]
+        if index_node[0] == 'NUM':
+            return var['offset'] + int(index_node[1])
+        return None
+
+    def generate_load(self, id_node):
+        # ra = wartość identyfikatora
+        addr = self.direct_address(id_node)
+        var = self.symbols.variables[id_node[1]]
+        element = self.element_register(id_node)
+
+        if element:
+            self.emit(RLOAD, element)
+        elif id_node[0] == 'ID' and var.get('register'):
+            self.emit(RST, 'a')
+            self.emit(ADD, var['register'])
+        elif addr is not None:
+            self.emit(LOAD, addr)
+        elif id_node[0] == 'ID':
+            var = self.symbols.variables[id_node[1]]
+            self.emit(LOAD, var['address'])
+            self.emit(RLOAD, 'a')
+        else:
+            self.generate_address_to_rb(id_node)
+            self.emit(RLOAD, 'b')
+
+    def generate_store(self, id_node):
+        # identyfikator = ra
+        addr = self.direct_address(id_node)
+        var = self.symbols.variables[id_node[1]]
+        element = self.element_register(id_node)
+
+        if element:
+            self.emit(RSTORE, element)
+        elif id_node[0] == 'ID' and var.get('register'):
+            self.emit(SWP, var['register'])
+        elif addr is not None:
+            self.emit(STORE, addr)
+        else:
+            self.emit(SWP, 'g')
+            self.generate_address_to_rb(id_node)
+            self.emit(SWP, 'g')
+            self.emit(RSTORE, 'b')
+
+    def element_register(self, id_node):
+        if id_node[0] == 'ARRAY_ID' and id_node[2][0] == 'ID':
+            return self.element_registers.get((id_node[1], id_node[2][1]))
+        return None
+
+    def generate_address_to_rb(self, id_node):
+        tag = id_node[0]
+        name = id_node[1]
+
+        var = self.check_identifier(id_node)
 
         if tag == 'ID':
             if var.get('is_param', False):
-                self.emit(f"LOAD {var['address']}")
-                self.emit("SWP b")
+                self.emit(LOAD, var['address'])
+                self.emit(SWP, 'b')
             else:
                 self.generate_constant(var['address'])
-                self.emit("SWP b")
+                self.emit(SWP, 'b')
         
         elif tag == 'ARRAY_ID':
             index_node = id_node[2]
@@ -583,12 +888,24 @@ class CodeGenerator:
     def generate_array_address_to_rb(self, name, index_node):
         var = self.symbols.variables[name]
         
-        if var.get('is_param', False):
-            self.emit(f"LOAD {var['address']}")
+        if var.get('is_param', False) and var.get('register'):
+            # Wskaźnik trzymany w rejestrze przez allocate_loop_registers
+            self.emit(RST, 'a')
+            self.emit(ADD, var['register'])
+        elif var.get('is_param', False):
+            self.emit(LOAD, var['address'])
         else:
             self.generate_constant(var['offset'])
+
+        # Indeks trzymany w rejestrze można dodać od razu
+        if not isinstance(index_node, int) and index_node[0] == 'ID':
+            index_var = self.symbols.variables.get(index_node[1])
+            if index_var and index_var.get('register') and index_var.get('initialized'):
+                self.emit(ADD, index_var['register'])
+                self.emit(SWP, 'b')
+                return
         
-        self.emit("SWP h") # rh = offset
+        self.emit(SWP, 'h') # rh = offset
 
         if isinstance(index_node, int):
             self.generate_constant(index_node)
@@ -597,93 +914,448 @@ class CodeGenerator:
         else:
             self.walk(index_node) 
             
-        self.emit("SWP b")
-        self.emit("SWP h") 
-        self.emit("ADD b") 
-        self.emit("SWP b") 
-
-    def walk_condition(self, node):
-            # node: ('CONDITION', rel_op, left_val, right_val, lineno)
-            rel_op = node[1]
-            left = node[2]
-            right = node[3]
-
-            t1 = self.symbols.get_address("__tmp1", 0)
-            t2 = self.symbols.get_address("__tmp2", 0)
-
-            self.walk(right)
-            self.emit(f"STORE {t1}")
-            self.walk(left)
-            self.emit(f"STORE {t2}")
-
-            if rel_op == '=':
-                # (a-b) + (b-a).
-                self.emit(f"LOAD {t2}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t1}")
-                self.emit("SUB b")
-                self.emit("SWP c") 
-                self.emit(f"LOAD {t1}")
-                self.emit("SWP b"); 
-                self.emit(f"LOAD {t2}")
-                self.emit("SUB b")
-                self.emit("ADD c") 
-                self.emit("SWP c")
-                self.emit("RST a")
-                self.emit("INC a")
-                self.emit("SUB c")
-
-            elif rel_op == '!=':
-                # |a-b|. Jeśli > 0 -> różne
-                self.emit(f"LOAD {t2}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t1}")
-                self.emit("SUB b")
-                self.emit("SWP c")
-                self.emit(f"LOAD {t1}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t2}")
-                self.emit("SUB b")
-                self.emit("ADD c") 
-
-            elif rel_op == '<':
-                # Prawda gdy b - a > 0
-                self.emit(f"LOAD {t2}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t1}")
-                self.emit("SUB b")
-
-            elif rel_op == '>':
-                # Prawda gdy a - b > 0
-                self.emit(f"LOAD {t1}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t2}")
-                self.emit("SUB b")
-
-            elif rel_op == '<=':
-                # Prawda gdy a - b == 0 -> (1 - (a - b))
-                self.emit(f"LOAD {t1}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t2}")
-                self.emit("SUB b")
-                self.emit("SWP c")
-                self.emit("RST a")
-                self.emit("INC a") 
-                self.emit("SUB c")
-
-            elif rel_op == '>=': # GE (a >= b)
-                # Prawda gdy b - a == 0 -> (1 - (b - a))
-                self.emit(f"LOAD {t2}")
-                self.emit("SWP b")
-                self.emit(f"LOAD {t1}")
-                self.emit("SUB b")
-                self.emit("SWP c")
-                self.emit("RST a") 
-                self.emit("INC a") 
-                self.emit("SUB c")
+        self.emit(SWP, 'b')
+        self.emit(SWP, 'h') 
+        self.emit(ADD, 'b') 
+        self.emit(SWP, 'b') 
+
+    def generate_multiplication(self):
+        # ra = ra * rb, rejestry: rb - mnożna, rc - licznik, rd - wynik
+        # Licznikiem pętli zostaje mniejszy z argumentów
+        self.emit(SWP, 'c')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'c')
+        self.emit(SUB, 'b')
+        ordered = Label()
+        start = Label()
+        end = Label()
+        skip_add = Label()
+        self.emit(JZERO, ordered)
+
+        self.emit(RST, 'a')
+        self.emit(ADD, 'b')
+        self.emit(SWP, 'c')
+        self.emit(SWP, 'b')
+
+        self.place(ordered)
+        self.emit(RST, 'd')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'c')
+        self.emit(JZERO, end)
+
+        # Licznik sprawdzany na końcu obrotu; na starcie obrotu ra = rc
+        self.place(start)
+        # ra = najmłodszy bit licznika
+        self.emit(SHR, 'c')
+        self.emit(SUB, 'c')
+        self.emit(SUB, 'c')
+        self.emit(JZERO, skip_add)
+
+        self.emit(SWP, 'd')
+        self.emit(ADD, 'b')
+        self.emit(SWP, 'd')
+
+        self.place(skip_add)
+        self.emit(SHL, 'b')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'c')
+        self.emit(JPOS, start)
+
+        self.place(end)
+        self.emit(SWP, 'd')
+
+    def generate_constant_operation(self, op, value):
+        # ra = ra op value dla działań z ustalonym w czasie kompilacji argumentem
+        if op in ['+', '-']:
+            for _ in range(value):
+                self.emit(INC if op == '+' else DEC, 'a')
+
+        elif op == 'SHL':
+            for _ in range(value):
+                self.emit(SHL, 'a')
+
+        elif op == 'SHR':
+            for _ in range(value):
+                self.emit(SHR, 'a')
+
+        elif op == 'AND':
+            # ra % 2^k = ra - ((ra >> k) << k), value = 2^k - 1
+            k = value.bit_length()
+            self.emit(SWP, 'b')
+            self.emit(RST, 'a')
+            self.emit(ADD, 'b')
+            for _ in range(k):
+                self.emit(SHR, 'a')
+            for _ in range(k):
+                self.emit(SHL, 'a')
+            self.emit(SWP, 'b')
+            self.emit(SUB, 'b')
+
+        elif op == 'MULC':
+            self.emit(SWP, 'b')
+            self.emit(RST, 'a')
+            self.emit(ADD, 'b')
+            for digit in multiplication_chain(value)[1:]:
+                self.emit(SHL, 'a')
+                if digit == 1:
+                    self.emit(ADD, 'b')
+                elif digit == -1:
+                    self.emit(SUB, 'b')
+
+    def generate_division(self):
+        # rd = rc / rb, rc = rc % rb, re - maska bieżącego bitu ilorazu
+        self.emit(RST, 'd')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'b')
+        divisor = Label()
+        shl_start = Label()
+        main_start = Label()
+        main_body = Label()
+        end = Label()
+        self.emit(JPOS, divisor)
+
+        # Dzielenie przez zero: iloraz i reszta równe 0
+        self.emit(RST, 'c')
+        self.emit(JUMP, end)
+
+        self.place(divisor)
+        self.emit(RST, 'e')
+        self.emit(INC, 'e')
+
+        # Przesuwanie dzielnika aż przekroczy dzielną; warunek sprawdzany na końcu obrotu
+        self.emit(RST, 'a')
+        self.emit(ADD, 'b')
+        self.emit(SUB, 'c')
+        self.emit(JPOS, main_start)
+        self.place(shl_start)
+        self.emit(SHL, 'b')
+        self.emit(SHL, 'e')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'b')
+        self.emit(SUB, 'c')
+        self.emit(JZERO, shl_start)
+
+        self.place(main_start)
+        self.emit(SHR, 'e')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'e')
+        self.emit(JZERO, end)
+
+        self.place(main_body)
+        self.emit(SHR, 'b')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'b')
+        self.emit(SUB, 'c')
+        self.emit(JPOS, main_start)
+
+        self.emit(SWP, 'c')
+        self.emit(SUB, 'b')
+        self.emit(SWP, 'c')
+        self.emit(SWP, 'd')
+        self.emit(ADD, 'e')
+        self.emit(SWP, 'd')
+
+        # Kopia nagłówka pętli zamiast skoku do main_start
+        self.emit(SHR, 'e')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'e')
+        self.emit(JPOS, main_body)
+
+        self.place(end)
+
+    def walk_commands(self, commands):
+        for i, cmd in enumerate(commands):
+            shared = i + 1 < len(commands) and self.shares_division(cmd, commands[i + 1])
+
+            self.keep_division = shared
+            self.frames.append((cmd[0], cmd[-1]))
+            self.statement_count += 1
+            self.statements.append(self.statement_count)
+            self.walk(cmd)
+            self.statements.pop()
+            self.frames.pop()
+            self.keep_division = False
 
-    def walk_call(self, node):
-        # node: ('CALL', name, args, lineno)
+            self.division_ready = (value_key(cmd[2][2]), value_key(cmd[2][3])) if shared else None
+
+    def shares_division(self, first, second):
+        # Czy druga instrukcja może użyć ilorazu i reszty policzonych w pierwszej
+        for cmd in (first, second):
+            if cmd[0] != 'ASSIGN' or cmd[2][0] != 'BINARY_OP' or cmd[2][1] not in ['/', '%']:
+                return False
+
+        left, right = first[2][2], first[2][3]
+        if (value_key(left), value_key(right)) != (value_key(second[2][2]), value_key(second[2][3])):
+            return False
+
+        return not self.may_alias(first[1], left) and not self.may_alias(first[1], right)
+
+    def may_alias(self, target, value):
+        # Czy zapis do target może zmienić wartość value
+        if value[0] == 'NUM':
+            return False
+
+        names = [value[1]]
+        if value[0] == 'ARRAY_ID' and value[2][0] == 'ID':
+            names.append(value[2][1])
+
+        if target[1] in names:
+            return True
+
+        target_var = self.symbols.variables.get(target[1])
+        if target_var is None:
+            return True
+        if not target_var.get('is_param', False):
+            return False
+
+        for name in names:
+            var = self.symbols.variables.get(name)
+            if var is None or var.get('is_param', False):
+                return True
+        return False
+
+    def load_variable(self, var):
+        if var.get('register'):
+            self.emit(RST, 'a')
+            self.emit(ADD, var['register'])
+        else:
+            self.emit(LOAD, var['address'])
+
+    def store_variable(self, var):
+        if var.get('register'):
+            self.emit(SWP, var['register'])
+        else:
+            self.emit(STORE, var['address'])
+
+    def subtract_variable(self, var):
+        # ra = ra - var
+        if var.get('register'):
+            self.emit(SUB, var['register'])
+        else:
+            self.emit(SWP, 'b')
+            self.emit(LOAD, var['address'])
+            self.emit(SWP, 'b')
+            self.emit(SUB, 'b')
+
+    def pin_variables(self, variables, clobbered, dirty=None):
+        # Przydziela wolne rejestry kolejnym zmiennym, dopóki starcza rejestrów
+        pins = []
+        for var in variables:
+            free = [r for r in self.free_registers if r not in clobbered]
+            if not free:
+                break
+            reg = free[0]
+            self.free_registers.remove(reg)
+            var['register'] = reg
+            pins.append({'var': var, 'register': reg, 'dirty': dirty is None or any(var is d for d in dirty)})
+        self.pinned.extend(pins)
+        return pins
+
+    def then_is_hotter(self, node):
+        if self.profile is None:
+            return False
+        then_runs = self.profile.first_executions(self.scope, node[2])
+        else_runs = self.profile.first_executions(self.scope, node[3])
+        return then_runs is not None and else_runs is not None and then_runs > else_runs
+
+    def loop_trips(self, node):
+        # Średnia liczba obrotów na jedno wejście do pętli według profilu albo None bez danych.
+        # Dla REPEAT profil zna tylko liczbę obrotów, więc wiadomo jedynie, czy pętla ruszyła.
+        if self.profile is None:
+            return None
+        tag = node[0]
+        body = {'WHILE': 2, 'REPEAT': 1}.get(tag, 4)
+        runs = self.profile.first_executions(self.scope, node[body])
+        if runs is None or runs == 0 or tag == 'REPEAT':
+            return runs if runs == 0 else None
+        entries = self.profile.executions(self.scope, node[-1])
+        return runs / entries if entries else None
+
+    def allocate_loop_registers(self, node):
+        # Najczęściej używane skalary i wskaźniki parametrów T pętli trafiają do rejestrów na czas jej trwania
+        trips = self.loop_trips(node)
+        if trips == 0:
+            # Pętla, która w profilu ani razu nie obróciła się, nie zwróci kosztu ładowania
+            return []
+
+        uses = {}
+        written = set()
+        count_uses(node, uses, written)
+        calls = count_calls(node)
+
+        candidates = []
+        for name, weight in uses.items():
+            var = self.symbols.variables.get(name)
+            if (var is None or var.get('type') != 'VAR' or var.get('is_param', False)
+                    or var.get('register')):
+                continue
+            if trips is not None:
+                # Zmierzona liczba obrotów zamiast zgadywanej wagi LOOP_WEIGHT
+                weight = weight * trips / LOOP_WEIGHT
+                if weight <= (2 if name in written else 1):
+                    continue
+            # Zapis i odczyt przy każdym wywołaniu musi się zwrócić na odwołaniach
+            if weight <= calls * (2 if name in written else 1):
+                continue
+            candidates.append((weight, name, var))
+
+        # Wskaźnik parametru T nie zmienia się w pętli: rejestr zamiast LOAD przy każdym odwołaniu
+        elements = {}
+        count_array_uses(node, elements, set(self.element_registers))
+        for name, weight in elements.items():
+            var = self.symbols.variables.get(name)
+            if (var is None or var.get('type') != 'ARRAY' or not var.get('is_param', False)
+                    or var.get('register')):
+                continue
+            if trips is not None:
+                weight = weight * trips / LOOP_WEIGHT
+                if weight <= 1:
+                    continue
+            if weight <= calls:
+                continue
+            candidates.append((weight, name, var))
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+
+        dirty = [var for _, name, var in candidates if name in written]
+        pins = self.pin_variables([var for _, _, var in candidates], clobbered_registers(node), dirty)
+        for pin in pins:
+            self.emit(LOAD, pin['var']['address'])
+            self.emit(SWP, pin['register'])
+        return pins
+
+    def allocate_element_registers(self, node, iterator):
+        # Adres t[i] trzymany w rejestrze i przesuwany razem z iteratorem pętli FOR
+        it_name = node[1]
+        trips = self.loop_trips(node)
+        if trips == 0:
+            return []
+        uses = {}
+        count_element_uses(node[4], it_name, uses, LOOP_WEIGHT if trips is None else trips)
+        calls = count_calls(node)
+
+        candidates = []
+        for name, weight in uses.items():
+            var = self.symbols.variables.get(name)
+            # Przy każdym wywołaniu adres jest zrzucany do pamięci i wczytywany z powrotem
+            if var is None or var.get('type') != 'ARRAY' or weight <= 2 * calls:
+                continue
+            # Przy jednym odwołaniu na wejście ustawienie rejestru się nie zwraca
+            if trips is not None and weight <= 1:
+                continue
+            candidates.append((weight, name, var))
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+
+        pins = []
+        clobbered = clobbered_registers(node)
+        for _, name, array in candidates:
+            slot_name = self.symbols.declare_hidden_variable()
+            pinned = self.pin_variables([self.symbols.variables[slot_name]], clobbered)
+            if not pinned:
+                self.symbols.remove_variable(slot_name)
+                break
+            pin = pinned[0]
+            pin['array'] = name
+            pin['slot'] = slot_name
+            pins.append(pin)
+
+            self.load_variable(iterator)
+            if array.get('is_param', False):
+                self.emit(SWP, 'b')
+                self.emit(LOAD, array['address'])
+                self.emit(ADD, 'b')
+            elif array['offset']:
+                self.emit(SWP, 'b')
+                self.generate_constant(array['offset'])
+                self.emit(ADD, 'b')
+            self.emit(SWP, pin['register'])
+            self.element_registers[(name, it_name)] = pin['register']
+        return pins
+
+    def release_element_registers(self, pins, it_name):
+        for pin in pins:
+            del self.element_registers[(pin['array'], it_name)]
+            self.symbols.remove_variable(pin['slot'])
+        self.release_registers(pins, write_back=False)
+
+    def release_registers(self, pins, write_back=True):
+        for pin in pins:
+            if write_back and pin['dirty']:
+                self.emit(SWP, pin['register'])
+                self.emit(STORE, pin['var']['address'])
+            del pin['var']['register']
+            self.pinned.remove(pin)
+            self.free_registers.append(pin['register'])
+        self.free_registers.sort()
+
+    def spill_registers(self):
+        for pin in self.pinned:
+            if pin['dirty']:
+                self.emit(SWP, pin['register'])
+                self.emit(STORE, pin['var']['address'])
+
+    def reload_registers(self):
+        for pin in self.pinned:
+            self.emit(LOAD, pin['var']['address'])
+            self.emit(SWP, pin['register'])
+
+    def walk_condition(self, node, target, jump_if=False):
+        """Skok do target gdy warunek ma wartość jump_if, w przeciwnym razie kod przechodzi dalej."""
+        # node: ('CONDITION', rel_op, left_val, right_val, lineno)
+        rel_op = node[1]
+        left = node[2]
+        right = node[3]
+        lineno = node[4]
+
+        if rel_op in ['>', '<', '>=', '<=']:
+            # '>' i '<=' patrzą na left - right, '<' i '>=' na right - left
+            if rel_op in ['>', '<=']:
+                self.walk(('BINARY_OP', '-', left, right, lineno))
+            else:
+                self.walk(('BINARY_OP', '-', right, left, lineno))
+
+            # Prawda dla '>'/'<' gdy różnica > 0, dla '<='/'>=' gdy różnica == 0
+            positive_is_true = rel_op in ['>', '<']
+            self.emit(JPOS if positive_is_true == jump_if else JZERO, target)
+            return
+
+        # '=' i '!=': równość gdy obie różnice są zerowe
+        zero_test = None
+        if right[0] == 'NUM' and int(right[1]) == 0:
+            zero_test = left
+        elif left[0] == 'NUM' and int(left[1]) == 0:
+            zero_test = right
+
+        jump_when_equal = (rel_op == '=') == jump_if
+
+        if zero_test is not None:
+            self.walk(zero_test)
+            self.emit(JZERO if jump_when_equal else JPOS, target)
+            return
+
+        self.walk(left)
+        self.emit(SWP, 'g')
+        self.walk(right)
+        self.emit(SWP, 'b')
+        self.emit(RST, 'a')
+        self.emit(ADD, 'g')
+        self.emit(SUB, 'b')
+
+        if jump_when_equal:
+            # left > right wyklucza równość
+            skip = Label()
+            self.emit(JPOS, skip)
+            self.emit(SWP, 'b')
+            self.emit(SUB, 'g')
+            self.emit(JZERO, target)
+            self.place(skip)
+        else:
+            self.emit(JPOS, target)
+            self.emit(SWP, 'b')
+            self.emit(SUB, 'g')
+            self.emit(JPOS, target)
+
+    def check_call(self, node):
+        # Kontrola argumentów wywołania; node: ('CALL' lub 'INLINED', name, args, lineno)
         name = node[1]
         args = node[2]
         lineno = node[3]
@@ -722,22 +1394,37 @@ class CodeGenerator:
             
             if target_p_type != 'T' and source_var.get('type') == 'ARRAY':
                 raise Exception(f"Błąd w linii {arg_line}: Nie można przekazać tablicy jako skalar")
-            
-            if target_p_type == 'T':
+
+            if target_p_type != 'I':
+                source_var['initialized'] = True
+
+        return proc_info
+
+    def walk_call(self, node):
+        # node: ('CALL', name, args, lineno)
+        proc_info = self.check_call(node)
+
+        for (arg_name, arg_line), (target_p_type, param_name, _) in zip(node[2], proc_info['params']):
+            source_var = self.symbols.variables[arg_name]
+
+            if target_p_type == 'T' and source_var.get('is_param', False):
+                self.emit(LOAD, source_var['address'])
+            elif target_p_type == 'T':
                 self.generate_constant(source_var['offset'])
             else:
                 self.generate_address_to_rb(('ID', arg_name, arg_line))
-                self.emit("SWP b")      
+                self.emit(SWP, 'b')      
 
-            param_addr = proc_info['locals'][param_name]['address']
+            # Parametr skopiowany w procedurze ma adres kopii, wskaźnik jest osobno
+            param = proc_info['locals'][param_name]
+            param_addr = param.get('pointer', param['address'])
             
-            self.emit(f"STORE {param_addr}")
+            self.emit(STORE, param_addr)
 
-            if target_p_type != 'I':
-                source_var['initialized'] = True
-
-        self.calls_to_patch.append((len(self.instructions), name))
-        self.emit("CALL placeholder")
+        # Procedura widzi tylko pamięć i może użyć każdego rejestru
+        self.spill_registers()
+        self.emit(CALL, proc_info['label'])
+        self.reload_registers()
 
     def walk_procedure(self, node):
         #('PROCEDURE', (name, params), decls, cmds, lineno)
@@ -746,10 +1433,12 @@ class CodeGenerator:
         self.symbols.procedures[name]['params'] = params
 
         self.symbols.current_scope = name
-        self.symbols.procedures[name]['start_address'] = len(self.instructions)
+        self.scope = name
+        self.frames = [('PROCEDURE', node[4])]
+        self.place(self.symbols.procedures[name]['label'])
 
         ret_ptr = self.symbols.procedures[name]['return_address_ptr']
-        self.emit(f"STORE {ret_ptr}")
+        self.emit(STORE, ret_ptr)
 
         for d in node[2]: 
             d_tag = d[0]
@@ -758,9 +1447,56 @@ class CodeGenerator:
             elif d_tag == 'ARRAY':
                 self.symbols.declare_array(d[1], int(d[2]), int(d[3]), d[4])
 
-        for cmd in node[3]:
-            self.walk(cmd)
+        copies = self.copy_parameters(name, params, node[3])
 
-        self.emit(f"LOAD {ret_ptr}") 
-        self.emit("RTRN")
+        self.walk_commands(node[3])
+
+        for var, copy_out in copies:
+            if copy_out:
+                self.emit(LOAD, var['pointer'])
+                self.emit(SWP, 'b')
+                self.emit(LOAD, var['address'])
+                self.emit(RSTORE, 'b')
+
+        self.emit(LOAD, ret_ptr) 
+        self.emit(RTRN)
         self.symbols.current_scope = "MAIN"
+        self.scope = None
+        self.frames = []
+
+    def copy_parameters(self, name, params, commands):
+        # Parametr skalarny bez aliasów dostaje lokalną kopię: wartość jest kopiowana na wejściu,
+        # a zmieniona wraca pod wskaźnik na wyjściu. Zwraca listę (zmienna, czy kopiować na wyjściu).
+        uses = {}
+        written = set()
+        count_uses(commands, uses, written)
+        for call in call_nodes(commands):
+            callee = self.symbols.procedures.get(call[1])
+            types = [p[0] for p in callee['params']] if callee else []
+            for i, (arg_name, _) in enumerate(call[2]):
+                if i >= len(types) or types[i] != 'I':
+                    written.add(arg_name)
+
+        copies = []
+        for p_type, p_name, _ in params:
+            if p_type == 'T':
+                continue
+            others = [n for pair in self.aliases.get(name, ()) if p_name in pair for n in pair if n != p_name]
+            if any(n in written for n in others) or (others and p_name in written):
+                continue
+
+            copy_in = p_type != 'O' or not assigned_before_use(commands, p_name)
+            copy_out = p_type != 'I' and p_name in written
+            if uses.get(p_name, 0) <= PARAM_COPY_WEIGHT * (copy_in + copy_out):
+                continue
+
+            var = self.symbols.variables[p_name]
+            var['pointer'] = var['address']
+            var['address'] = self.symbols.allocate(f"__copy_{p_name}")
+            var['is_param'] = False
+            if copy_in:
+                self.emit(LOAD, var['pointer'])
+                self.emit(RLOAD, 'a')
+                self.emit(STORE, var['address'])
+            copies.append((var, copy_out))
+        return copies
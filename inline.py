@@ -0,0 +1,248 @@
+"""Wstawianie ciał procedur w miejsce wywołań.
+
+Wywołanie małej procedury albo procedury wywoływanej tylko z jednego miejsca zastępuje
+kopia jej ciała: parametry stają się argumentami wywołania (przekazanie przez referencję
+oznacza po prostu tę samą zmienną), a zmienne lokalne i iteratory dostają ukryte nazwy
+__inline_N_nazwa w zasięgu wywołującego. Przed ciałem zostaje węzeł
+('INLINED', nazwa, args, lineno) - generator sprawdza na nim argumenty tak jak przy CALL,
+ale nie emituje kodu. Sama procedura zostaje w programie i jest sprawdzana jak dotąd.
+
+Z profilem wykonania (profile_data.py) o wstawieniu decyduje zmierzona liczba wykonań
+wywołania zamiast zagnieżdżenia w pętli: wywołania, które się nie wykonały, zostają,
+a gorące mogą wstawić większe ciało.
+"""
+from licm import written_names, procedure_signatures
+
+# Ciało o co najwyżej tylu instrukcjach jest wstawiane w każde miejsce wywołania
+INLINE_SIZE_LIMIT = 12
+
+# W pętli narzut wywołania jest płacony w każdym obrocie, więc limit jest większy
+LOOP_INLINE_SIZE_LIMIT = 40
+
+# Wywołanie wykonane według profilu co najmniej tyle razy wstawia ciało do tego rozmiaru
+PROFILE_HOT_CALLS = 16
+PROFILE_INLINE_SIZE_LIMIT = 100
+
+
+def command_count(commands):
+    # Liczba instrukcji, dla których powstaje kod, łącznie z zagnieżdżonymi
+    count = 0
+    for cmd in commands:
+        tag = cmd[0]
+        if tag in ['DISCARD', 'INLINED']:
+            continue
+        count += 1
+        if tag == 'IF_ELSE':
+            count += command_count(cmd[2]) + command_count(cmd[3])
+        elif tag in ['IF', 'WHILE']:
+            count += command_count(cmd[2])
+        elif tag == 'REPEAT':
+            count += command_count(cmd[1])
+        elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+            count += command_count(cmd[4])
+    return count
+
+
+def count_call_sites(node, sites):
+    # Liczba miejsc wywołania każdej procedury
+    if isinstance(node, list):
+        for n in node:
+            count_call_sites(n, sites)
+        return
+    if not isinstance(node, tuple):
+        return
+    if node[0] == 'CALL':
+        sites[node[1]] = sites.get(node[1], 0) + 1
+        return
+    for n in node[1:]:
+        count_call_sites(n, sites)
+
+
+def constant_indices(node, arrays, found):
+    # Stałe indeksy użyte przy tablicach z arrays: nazwa -> zbiór indeksów
+    if isinstance(node, list):
+        for n in node:
+            constant_indices(n, arrays, found)
+        return
+    if not isinstance(node, tuple):
+        return
+    if node[0] == 'ARRAY_ID' and node[1] in arrays and node[2][0] == 'NUM':
+        found.setdefault(node[1], set()).add(int(node[2][1]))
+    for n in node[1:]:
+        constant_indices(n, arrays, found)
+
+
+def input_arguments(node, signatures, found):
+    # Zmienne przekazywane jako argumenty na miejsca parametrów I
+    if isinstance(node, list):
+        for n in node:
+            input_arguments(n, signatures, found)
+        return
+    if not isinstance(node, tuple):
+        return
+    if node[0] in ['CALL', 'INLINED']:
+        types = signatures.get(node[1], [])
+        for (arg_name, _), p_type in zip(node[2], types):
+            if p_type == 'I':
+                found.add(arg_name)
+        return
+    for n in node[1:]:
+        input_arguments(n, signatures, found)
+
+
+def rename(node, rename_name):
+    # Kopia node z nazwami zmiennych zamienionymi przez rename_name
+    if isinstance(node, list):
+        return [rename(n, rename_name) for n in node]
+    if not isinstance(node, tuple):
+        return node
+
+    tag = node[0]
+    if tag in ['ID', 'ARRAY_ID']:
+        return (tag, rename_name(node[1])) + tuple(rename(n, rename_name) for n in node[2:])
+    if tag in ['FOR_TO', 'FOR_DOWNTO']:
+        return (tag, rename_name(node[1])) + tuple(rename(n, rename_name) for n in node[2:])
+    if tag in ['CALL', 'INLINED']:
+        args = [(rename_name(arg_name), arg_line) for arg_name, arg_line in node[2]]
+        return (tag, node[1], args, node[3])
+    return tuple([tag] + [rename(n, rename_name) for n in node[1:]])
+
+
+class Inliner:
+    def __init__(self, ast, profile=None):
+        self.profile = profile
+        # Zasięg, do którego wstawiamy: nazwa procedury albo 'MAIN'
+        self.caller = None
+        self.signatures = procedure_signatures(ast)
+        self.sites = {}
+        count_call_sites(ast, self.sites)
+        # nazwa -> (parametry, deklaracje, ciało po wstawieniu), tylko procedury już przetworzone
+        self.bodies = {}
+        self.declarations = {}
+        # nazwa -> typ parametru procedury, do której wstawiamy
+        self.params = {}
+        self.temporaries = []
+        self.counter = 0
+
+    def call_count(self, node):
+        # Wykonania wywołania node według profilu albo None bez danych; jeśli w profilowanym
+        # kodzie wywołanie było już wstawione, liczy się pierwsza instrukcja wstawionego ciała
+        if self.profile is None:
+            return None
+        count = self.profile.executions(self.caller, node[3])
+        if count is None:
+            count = self.profile.first_executions(self.caller, self.bodies[node[1]][2])
+        return count
+
+    def should_inline(self, node, in_loop):
+        name = node[1]
+        size = command_count(self.bodies[name][2])
+        single_site = self.sites.get(name, 0) == 1
+
+        calls = self.call_count(node)
+        if calls is not None:
+            if calls == 0:
+                return single_site
+            if calls >= PROFILE_HOT_CALLS and size <= PROFILE_INLINE_SIZE_LIMIT:
+                return True
+
+        if single_site or size <= INLINE_SIZE_LIMIT:
+            return True
+        return in_loop and size <= LOOP_INLINE_SIZE_LIMIT
+
+    def can_inline(self, node, iterators):
+        name, args = node[1], node[2]
+        # Rekurencja i procedury zadeklarowane później zostają wywołaniami
+        if name not in self.bodies:
+            return False
+        params, _, body = self.bodies[name]
+        # Błędne wywołanie zgłosi generator przy CALL
+        if len(args) != len(params):
+            return False
+
+        written = set()
+        written_names(body, self.signatures, written)
+        t_params = {p_name for p_type, p_name, _ in params if p_type == 'T'}
+        indices = {}
+        constant_indices(body, t_params, indices)
+        inputs = set()
+        input_arguments(body, self.signatures, inputs)
+
+        for (arg_name, _), (p_type, p_name, _) in zip(args, params):
+            # Zapis do iteratora przez parametr jest dozwolony tylko przez wskaźnik
+            if p_name in written and arg_name in iterators:
+                return False
+            # Stały indeks poza zakresem tablicy wywołującego byłby błędem kompilacji
+            decl = self.declarations.get(arg_name)
+            if p_type == 'T' and decl is not None and decl[0] == 'ARRAY':
+                first, last = int(decl[2]), int(decl[3])
+                if any(i < first or i > last for i in indices.get(p_name, ())):
+                    return False
+            # Parametr O wywołującego nie może trafić dalej na miejsce I, choć parametr
+            # wołanej procedury bez typu może
+            if self.params.get(arg_name) == 'O' and p_name in inputs:
+                return False
+        return True
+
+    def expand(self, node):
+        # Instrukcje zastępujące wywołanie node
+        params, decls, body = self.bodies[node[1]]
+        self.counter += 1
+        prefix = f"__inline_{self.counter}_"
+
+        arguments = {p_name: arg_name for (arg_name, _), (_, p_name, _) in zip(node[2], params)}
+
+        def rename_name(name):
+            return arguments.get(name, prefix + name)
+
+        for decl in decls:
+            self.temporaries.append((decl[0], rename_name(decl[1])) + decl[2:])
+        return [('INLINED', node[1], node[2], node[3])] + rename(body, rename_name)
+
+    def commands(self, commands, iterators, in_loop):
+        result = []
+        for cmd in commands:
+            tag = cmd[0]
+            if tag == 'CALL':
+                if self.can_inline(cmd, iterators) and self.should_inline(cmd, in_loop):
+                    result.extend(self.expand(cmd))
+                else:
+                    result.append(cmd)
+            elif tag == 'IF':
+                result.append((tag, cmd[1], self.commands(cmd[2], iterators, in_loop), cmd[3]))
+            elif tag == 'IF_ELSE':
+                result.append((tag, cmd[1], self.commands(cmd[2], iterators, in_loop),
+                               self.commands(cmd[3], iterators, in_loop), cmd[4]))
+            elif tag == 'WHILE':
+                result.append((tag, cmd[1], self.commands(cmd[2], iterators, True), cmd[3]))
+            elif tag == 'REPEAT':
+                result.append((tag, self.commands(cmd[1], iterators, True), cmd[2], cmd[3]))
+            elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+                body = self.commands(cmd[4], iterators | {cmd[1]}, True)
+                result.append((tag, cmd[1], cmd[2], cmd[3], body, cmd[5]))
+            else:
+                result.append(cmd)
+        return result
+
+    def scope(self, caller, declarations, commands, params=()):
+        self.caller = caller
+        self.declarations = {decl[1]: decl for decl in declarations}
+        self.params = {p_name: p_type for p_type, p_name, _ in params}
+        self.temporaries = []
+        commands = self.commands(commands, frozenset(), False)
+        return list(declarations) + self.temporaries, commands
+
+
+def inline_procedures(ast, profile=None):
+    inliner = Inliner(ast, profile)
+
+    procedures = []
+    for proc in ast[1]:
+        name, params = proc[1]
+        decls, commands = inliner.scope(name, proc[2], proc[3], params)
+        inliner.bodies[name] = (params, decls, commands)
+        procedures.append(('PROCEDURE', proc[1], decls, commands, proc[4]))
+
+    main = ast[2]
+    decls, commands = inliner.scope('MAIN', main[1], main[2])
+    return ('PROGRAM_ALL', procedures, ('MAIN', decls, commands, main[3]))
@@ -0,0 +1,150 @@
+"""Reprezentacja pośrednia kodu maszyny wirtualnej.
+
+Program to lista, w której rozkazy są krotkami (opkod, argument), a etykiety (Label)
+oznaczają miejsca docelowe skoków. Argumentem jest nazwa rejestru, adres pamięci,
+etykieta albo None. Adresy skoków ustala dopiero assemble().
+
+Rozkazy z CodeGenerator są typu Instruction - krotką, która pamięta też, z którego
+miejsca źródła pochodzi: procedurę i stos zagnieżdżonych instrukcji z numerami linii.
+"""
+from vm import (OPCODES, READ, WRITE, LOAD, STORE, RLOAD, RSTORE, ADD, SUB, SWP,
+                RST, INC, DEC, SHL, SHR, JUMP, JPOS, JZERO, CALL, RTRN, HALT)
+
+JUMP_OPS = {JUMP, JPOS, JZERO, CALL}
+
+# Rozkazy, po których kończy się blok podstawowy (po CALL wraca RTRN)
+BLOCK_END_OPS = {JUMP, JPOS, JZERO, CALL, RTRN, HALT}
+
+
+class Label:
+    __slots__ = ('name',)
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __repr__(self):
+        return f"<{self.name or hex(id(self))}>"
+
+
+class Instruction(tuple):
+    """Rozkaz (opkod, argument) z miejscem w źródle.
+
+    scope - nazwa procedury, 'MAIN' albo None dla kodu wspólnego (start, podprogram dzielenia),
+    frames - krotka par (znacznik węzła, numer linii) od procedury do instrukcji najgłębszej,
+    statement - numer wystąpienia instrukcji najgłębszej, różny np. dla kopii rozwiniętej pętli.
+    """
+
+    def __new__(cls, op, arg=None, scope=None, frames=(), statement=None):
+        instruction = super().__new__(cls, (op, arg))
+        instruction.scope = scope
+        instruction.frames = frames
+        instruction.statement = statement
+        return instruction
+
+    @property
+    def lineno(self):
+        return self.frames[-1][1] if self.frames else None
+
+    def replace(self, op, arg):
+        # Inny rozkaz w tym samym miejscu źródła
+        return Instruction(op, arg, self.scope, self.frames, self.statement)
+
+
+class Block:
+    """Blok podstawowy: etykiety na wejściu i ciąg rozkazów bez skoków do środka."""
+    __slots__ = ('labels', 'instructions')
+
+    def __init__(self, labels=None, instructions=None):
+        self.labels = labels or []
+        self.instructions = instructions or []
+
+    def last(self):
+        return self.instructions[-1] if self.instructions else None
+
+
+def referenced_labels(code):
+    labels = set()
+    for item in code:
+        if not isinstance(item, Label) and isinstance(item[1], Label):
+            labels.add(item[1])
+    return labels
+
+
+def split_blocks(code):
+    blocks = [Block()]
+    for item in code:
+        if isinstance(item, Label):
+            if blocks[-1].instructions:
+                blocks.append(Block())
+            blocks[-1].labels.append(item)
+            continue
+        blocks[-1].instructions.append(item)
+        if item[0] in BLOCK_END_OPS:
+            blocks.append(Block())
+    if not blocks[-1].labels and not blocks[-1].instructions:
+        blocks.pop()
+    return blocks
+
+
+def join_blocks(blocks):
+    code = []
+    for block in blocks:
+        code.extend(block.labels)
+        code.extend(block.instructions)
+    return code
+
+
+def reachable_blocks(blocks):
+    """Indeksy bloków osiągalnych z początku programu przez skoki, CALL i przejścia dalej."""
+    index = {}
+    for n, block in enumerate(blocks):
+        for label in block.labels:
+            index[label] = n
+
+    reached = set()
+    pending = [0] if blocks else []
+    while pending:
+        n = pending.pop()
+        if n in reached:
+            continue
+        reached.add(n)
+        last = blocks[n].last()
+        # Po CALL wykonanie wraca do następnego bloku przez RTRN
+        if (last is None or last[0] not in (JUMP, RTRN, HALT)) and n + 1 < len(blocks):
+            pending.append(n + 1)
+        if last is not None and last[0] in JUMP_OPS and last[1] in index:
+            pending.append(index[last[1]])
+    return reached
+
+
+def instructions_of(code):
+    """Rozkazy w kolejności adresów, bez etykiet - odpowiadają wierszom z assemble()."""
+    return [item for item in code if not isinstance(item, Label)]
+
+
+def label_addresses(code):
+    addresses = {}
+    address = 0
+    for item in code:
+        if isinstance(item, Label):
+            addresses[item] = address
+        else:
+            address += 1
+    return addresses
+
+
+def assemble(code):
+    """Ustala adresy etykiet i zwraca program jako listę wierszy tekstu."""
+    addresses = label_addresses(code)
+
+    lines = []
+    for item in code:
+        if isinstance(item, Label):
+            continue
+        op, arg = item
+        if isinstance(arg, Label):
+            if arg not in addresses:
+                raise Exception(f"Błąd asemblera: Nieumieszczona etykieta {arg!r} w rozkazie {OPCODES[op]}")
+            arg = addresses[arg]
+        lines.append(OPCODES[op] if arg is None else f"{OPCODES[op]} {arg}")
+    return lines
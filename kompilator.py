@@ -1,27 +1,49 @@
-import sys
+import argparse
 from lexer import MyLexer
 from parser import MyParser
-from generator import CodeGenerator
+from passes import add_pass_arguments, select_passes, run_passes, format_report
+from cost_report import format_cost_report
+from profile_data import load_profile
+from ir import assemble
 
-def main():
-    if len(sys.argv) != 3:
-        print("Użycie: python compiler.py <wejście> <wyjście>")
-        return
-
-    with open(sys.argv[1], 'r') as f:
-        data = f.read()
 
+def compile_source(data, selected, profile=None):
+    """Zwraca (CodeGenerator z kodem pośrednim, raport przebiegów) albo (None, []) po błędzie składni."""
     lexer = MyLexer()
     parser = MyParser()
-    
+
     ast = parser.parse(lexer.tokenize(data))
-    if ast:
-        gen = CodeGenerator()
-        gen.walk(ast)
-        
-        with open(sys.argv[2], 'w') as f:
-            f.write("\n".join(gen.instructions) + "\n")
-        print(f"Kompilacja zakończona sukcesem -> {sys.argv[2]}")
+    if not ast:
+        return None, []
+    return run_passes(ast, selected, profile)
+
+
+def main():
+    args = argparse.ArgumentParser(description="Kompilator do kodu maszyny wirtualnej")
+    args.add_argument('input', help="ścieżka do programu źródłowego")
+    args.add_argument('output', help="ścieżka do pliku z kodem maszyny wirtualnej")
+    add_pass_arguments(args)
+    args.add_argument('--cost-report', action='store_true',
+                      help="wypisuje szacowany koszt każdej linii, pętli i procedury")
+    options = args.parse_args()
+
+    with open(options.input, 'r') as f:
+        data = f.read()
+
+    selected = select_passes(options.level, options.enable, options.disable)
+    profile = load_profile(options.profile_use) if options.profile_use else None
+    gen, report = compile_source(data, selected, profile)
+    if gen is None:
+        return
+    instructions = assemble(gen.instructions)
+
+    with open(options.output, 'w') as f:
+        f.write("\n".join(instructions) + "\n")
+    print(f"Kompilacja zakończona sukcesem -> {options.output}")
+    print(format_report(report))
+    if options.cost_report:
+        print()
+        print(format_cost_report(gen.instructions, data))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
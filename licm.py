@@ -0,0 +1,214 @@
+"""Wyciąganie obliczeń niezmienniczych przed pętle.
+
+Wyrażenie (BINARY_OP) albo odczyt t[k], którego żaden składnik nie jest modyfikowany w
+ciele pętli, liczone jest raz przed pętlą do ukrytej zmiennej __licm_N, a w pętli zastępuje
+je odczyt tej zmiennej. Przebieg działa na drzewie AST po fold_constants. Dla WHILE
+obliczenia trafiają za test wejścia (IF warunek THEN obliczenia; REPEAT ... UNTIL nie warunek),
+więc pętla bez obrotów ich nie wykonuje.
+"""
+from generator import INC_CHAIN_LIMIT
+
+LOOPS = ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']
+
+NEGATED = {'=': '!=', '!=': '=', '<': '>=', '>=': '<', '>': '<=', '<=': '>'}
+
+
+def expression_key(node):
+    # Postać wyrażenia bez numerów linii
+    if node[0] == 'NUM':
+        return ('NUM', int(node[1]))
+    if node[0] == 'ID':
+        return ('ID', node[1])
+    if node[0] == 'ARRAY_ID':
+        return ('ARRAY_ID', node[1], expression_key(node[2]))
+    return ('BINARY_OP', node[1], expression_key(node[2]), expression_key(node[3]))
+
+
+def names_read(node):
+    if node[0] == 'NUM':
+        return set()
+    if node[0] == 'ID':
+        return {node[1]}
+    if node[0] == 'ARRAY_ID':
+        return {node[1]} | names_read(node[2])
+    return names_read(node[2]) | names_read(node[3])
+
+
+def written_names(node, signatures, written):
+    # Zmienne i tablice, które mogą się zmienić w trakcie wykonania node;
+    # signatures: nazwa procedury -> lista typów parametrów
+    if isinstance(node, list):
+        for n in node:
+            written_names(n, signatures, written)
+        return
+    if not isinstance(node, tuple):
+        return
+
+    tag = node[0]
+    if tag in ['ASSIGN', 'READ']:
+        written.add(node[1][1])
+    elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+        written.add(node[1])
+    elif tag == 'CALL':
+        types = signatures.get(node[1])
+        for i, (arg_name, _) in enumerate(node[2]):
+            if types is None or i >= len(types) or types[i] != 'I':
+                written.add(arg_name)
+
+    for n in node[1:]:
+        written_names(n, signatures, written)
+
+
+def procedure_signatures(ast):
+    return {proc[1][0]: [p_type for p_type, _, _ in proc[1][1]] for proc in ast[1]}
+
+
+def is_cheap(node):
+    # Krótkie łańcuchy INC/DEC/SHL/SHR są tańsze niż odczyt zmiennej pomocniczej
+    return node[1] in ['+', '-', 'SHL', 'SHR'] and node[3][0] == 'NUM' and int(node[3][1]) <= INC_CHAIN_LIMIT
+
+
+def loop_body(node):
+    return node[2] if node[0] == 'WHILE' else node[1] if node[0] == 'REPEAT' else node[4]
+
+
+class InvariantHoister:
+    def __init__(self, signatures):
+        # nazwa procedury -> lista typów parametrów
+        self.signatures = signatures
+        self.params = set()
+        self.temporaries = []
+        self.counter = 0
+
+    def is_candidate(self, node, written):
+        if node[0] not in ['BINARY_OP', 'ARRAY_ID']:
+            return False
+        if names_read(node) & written:
+            return False
+        if node[0] == 'ARRAY_ID':
+            # Odczyt ze stałym indeksem to zwykły LOAD
+            return node[2][0] != 'NUM'
+        return not is_cheap(node)
+
+    def collect(self, node, written, found):
+        # found: klucz -> pierwsze wystąpienie, w kolejności w kodzie
+        if isinstance(node, list):
+            for n in node:
+                self.collect(n, written, found)
+            return
+        if not isinstance(node, tuple) or node[0] in ['DISCARD', 'CALL', 'INLINED']:
+            return
+
+        if node[0] in ['BINARY_OP', 'ARRAY_ID', 'NUM', 'ID']:
+            if self.is_candidate(node, written):
+                found.setdefault(expression_key(node), node)
+                return
+            if node[0] == 'BINARY_OP':
+                self.collect([node[2], node[3]], written, found)
+            return
+
+        if node[0] in ['ASSIGN', 'READ']:
+            # Cel przypisania nie jest odczytem
+            target = node[1]
+            if target[0] == 'ARRAY_ID':
+                self.collect(target[2], written, found)
+            self.collect(list(node[2:-1]), written, found)
+            return
+
+        self.collect(list(node[1:]), written, found)
+
+    def replace(self, node, hoisted):
+        if isinstance(node, list):
+            return [self.replace(n, hoisted) for n in node]
+        if not isinstance(node, tuple) or node[0] in ['DISCARD', 'CALL', 'INLINED']:
+            return node
+
+        tag = node[0]
+        if tag in ['BINARY_OP', 'ARRAY_ID']:
+            key = expression_key(node)
+            if key in hoisted:
+                return ('ID', hoisted[key], node[-1])
+            if tag == 'BINARY_OP':
+                return ('BINARY_OP', node[1], self.replace(node[2], hoisted),
+                        self.replace(node[3], hoisted), node[4])
+            return node
+        if tag in ['ASSIGN', 'READ']:
+            target = node[1]
+            return (tag, target) + tuple(self.replace(n, hoisted) for n in node[2:])
+        if tag in ['NUM', 'ID']:
+            return node
+        return tuple([tag] + [self.replace(n, hoisted) for n in node[1:]])
+
+    def hoist(self, node):
+        # Zwraca listę instrukcji: obliczenia przed pętlą i samą pętlę
+        written = set()
+        written_names(node, self.signatures, written)
+        # Parametry procedury mogą wskazywać tę samą zmienną
+        if written & self.params:
+            written |= self.params
+
+        found = {}
+        if node[0] == 'WHILE':
+            self.collect(node[1], written, found)
+        elif node[0] == 'REPEAT':
+            self.collect(node[2], written, found)
+        self.collect(loop_body(node), written, found)
+
+        preheader = []
+        hoisted = {}
+        for key, expr in found.items():
+            self.counter += 1
+            name = f"__licm_{self.counter}"
+            lineno = expr[-1]
+            hoisted[key] = name
+            self.temporaries.append(('VAR', name, lineno))
+            preheader.append(('ASSIGN', ('ID', name, lineno), expr, lineno))
+
+        tag = node[0]
+        if tag == 'WHILE' and preheader:
+            # Obliczenia za testem wejścia: pętla, która się nie obróci, nie płaci za nie.
+            # REPEAT z zaprzeczonym warunkiem daje ten sam kod co obrócona pętla WHILE.
+            cond = self.replace(node[1], hoisted)
+            until = ('CONDITION', NEGATED[cond[1]], cond[2], cond[3], cond[4])
+            loop = ('REPEAT', self.commands(self.replace(node[2], hoisted)), until, node[3])
+            return [('IF', node[1], preheader + [loop], node[3])]
+        if tag == 'WHILE':
+            loop = (tag, self.replace(node[1], hoisted), self.commands(self.replace(node[2], hoisted)), node[3])
+        elif tag == 'REPEAT':
+            loop = (tag, self.commands(self.replace(node[1], hoisted)), self.replace(node[2], hoisted), node[3])
+        else:
+            loop = (tag, node[1], node[2], node[3], self.commands(self.replace(node[4], hoisted)), node[5])
+        return preheader + [loop]
+
+    def commands(self, commands):
+        result = []
+        for cmd in commands:
+            tag = cmd[0]
+            if tag in LOOPS:
+                result.extend(self.hoist(cmd))
+            elif tag == 'IF':
+                result.append((tag, cmd[1], self.commands(cmd[2]), cmd[3]))
+            elif tag == 'IF_ELSE':
+                result.append((tag, cmd[1], self.commands(cmd[2]), self.commands(cmd[3]), cmd[4]))
+            else:
+                result.append(cmd)
+        return result
+
+    def scope(self, declarations, commands, params=()):
+        self.params = {p_name for _, p_name, _ in params}
+        self.temporaries = []
+        commands = self.commands(commands)
+        return list(declarations) + self.temporaries, commands
+
+
+def hoist_invariants(ast):
+    hoister = InvariantHoister(procedure_signatures(ast))
+
+    procedures = []
+    for proc in ast[1]:
+        decls, commands = hoister.scope(proc[2], proc[3], proc[1][1])
+        procedures.append(('PROCEDURE', proc[1], decls, commands, proc[4]))
+
+    main = ast[2]
+    decls, commands = hoister.scope(main[1], main[2])
+    return ('PROGRAM_ALL', procedures, ('MAIN', decls, commands, main[3]))
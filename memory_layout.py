@@ -0,0 +1,148 @@
+"""Rozmieszczenie zmiennych w pamięci.
+
+Adres zmiennej kosztuje tylko wtedy, gdy trzeba go zbudować w rejestrze: offset tablicy
+indeksowanej zmienną lub przekazywanej jako T oraz adres skalara przekazywanego do
+procedury. Takie zmienne, ważone liczbą odwołań, dostają adresy najtańsze do zbudowania,
+reszta wypełnia pozostałe luki. Wynik trafia do SymbolTable.layout.
+"""
+from generator import LOOP_WEIGHT
+from constants import constant_cost
+
+# Ile pierwszych wolnych komórek porównujemy przy wyborze adresu skalara
+SCALAR_CANDIDATES = 64
+
+
+def declarations(ast):
+    # zasięg -> {nazwa: (rozmiar, first)} dla parametrów i zmiennych lokalnych
+    scopes = {}
+    for proc in ast[1]:
+        name, params = proc[1]
+        decls = {}
+        for p_type, p_name, _ in params:
+            decls[p_name] = (1, None)
+        for decl in proc[2]:
+            decls[decl[1]] = declaration_size(decl)
+        scopes[name] = decls
+
+    scopes['MAIN'] = {decl[1]: declaration_size(decl) for decl in ast[2][1]}
+    return scopes
+
+
+def declaration_size(decl):
+    if decl[0] == 'ARRAY':
+        first, last = int(decl[2]), int(decl[3])
+        return (max(last - first + 1, 1), first)
+    return (1, None)
+
+
+def count_address_uses(node, params, weights, weight=1):
+    # Ważona liczba miejsc, w których adres zmiennej trafia do rejestru
+    if isinstance(node, list):
+        for n in node:
+            count_address_uses(n, params, weights, weight)
+        return
+    if not isinstance(node, tuple):
+        return
+
+    tag = node[0]
+    if tag == 'DISCARD':
+        return
+    if tag == 'ARRAY_ID' and node[2][0] != 'NUM' and node[1] not in params:
+        weights[node[1]] = weights.get(node[1], 0) + weight
+    if tag == 'CALL':
+        for arg_name, _ in node[2]:
+            if arg_name not in params:
+                weights[arg_name] = weights.get(arg_name, 0) + weight
+        return
+    if tag in ['WHILE', 'REPEAT', 'FOR_TO', 'FOR_DOWNTO']:
+        weight *= LOOP_WEIGHT
+
+    for n in node[1:]:
+        count_address_uses(n, params, weights, weight)
+
+
+class Memory:
+    """Zajęte przedziały adresów [start, end)."""
+
+    def __init__(self):
+        self.used = []
+
+    def is_free(self, start, size):
+        return self.blocker(start, size) is None
+
+    def blocker(self, start, size=1):
+        # Koniec przedziału nachodzącego na [start, start + size), jeśli taki jest
+        for begin, end in self.used:
+            if begin < start + size and start < end:
+                return end
+        return None
+
+    def take(self, start, size):
+        self.used.append((start, start + size))
+
+    def bases(self, lowest):
+        # Najmniejsze wolne miejsca na kandydatów: lowest i końce zajętych przedziałów
+        yield lowest
+        for _, end in sorted(self.used):
+            if end > lowest:
+                yield end
+
+    def place_array(self, first, size, cost):
+        best = None
+        for base in self.bases(first):
+            if self.is_free(base, size) and (best is None or cost(base - first) < cost(best - first)):
+                best = base
+        self.take(best, size)
+        return best
+
+    def place_scalar(self, cost):
+        end = self.end()
+        candidates = []
+        address = 0
+        while len(candidates) < SCALAR_CANDIDATES and address <= end:
+            blocker = self.blocker(address)
+            if blocker is None:
+                candidates.append(address)
+                address += 1
+            else:
+                address = blocker
+        best = min(candidates, key=lambda a: (cost(a), a))
+        self.take(best, 1)
+        return best
+
+    def end(self):
+        return max((end for _, end in self.used), default=0)
+
+
+def plan_memory(ast):
+    """Zwraca (adresy {(zasięg, nazwa): adres}, pierwszy wolny adres za nimi)."""
+    scopes = declarations(ast)
+
+    items = []
+    for scope, decls in scopes.items():
+        if scope == 'MAIN':
+            params = set()
+            commands = ast[2][2]
+        else:
+            proc = next(p for p in ast[1] if p[1][0] == scope)
+            params = {p_name for _, p_name, _ in proc[1][1]}
+            commands = proc[3]
+
+        weights = {}
+        count_address_uses(commands, params, weights)
+        for name, (size, first) in decls.items():
+            items.append((weights.get(name, 0), scope, name, size, first))
+
+    # Najpierw zmienne, których adresy są budowane najczęściej
+    items.sort(key=lambda item: -item[0])
+
+    memory = Memory()
+    addresses = {}
+    for weight, scope, name, size, first in items:
+        cost = constant_cost if weight else (lambda value: value)
+        if first is None:
+            addresses[(scope, name)] = memory.place_scalar(cost)
+        else:
+            addresses[(scope, name)] = memory.place_array(first, size, cost)
+
+    return addresses, memory.end()
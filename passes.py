@@ -0,0 +1,123 @@
+"""Menedżer przebiegów optymalizujących.
+
+Przebiegi na drzewie AST działają przed CodeGenerator.walk, przebiegi na kodzie
+pośrednim po nim. Poziom -O wybiera domyślny zestaw, a pojedyncze przebiegi można
+dodatkowo włączyć albo wyłączyć po nazwie. Dla każdego przebiegu mierzony jest czas
+oraz zmiana liczby rozkazów i szacowanego kosztu kodu (cost_report.estimated_cost) -
+dla przebiegów na AST kod jest w tym celu generowany po każdym z nich.
+
+Przebieg może wystąpić w PASSES więcej niż raz - propagate działa też po unroll, bo
+rozwinięte kopie ciała pętli dają nowe znane wartości. Wyłączenie przebiegu po nazwie
+wyłącza wszystkie jego wystąpienia.
+
+Profil wykonania (profile_data.py) trafia do generatora i do przebiegów z PROFILE_PASSES.
+"""
+import time
+from generator import CodeGenerator
+from memory_layout import plan_memory
+from folding import fold_constants
+from inline import inline_procedures
+from propagation import propagate_constants
+from unroll import unroll_loops
+from licm import hoist_invariants
+from cse import number_values
+from dead_code import eliminate_dead_code
+from block_layout import layout_blocks
+from peephole import optimize
+from cost_report import estimated_cost
+from ir import instructions_of
+
+def propagate_again(ast):
+    # Kopie procedur powstały w pierwszym przebiegu; nowe dostałyby już zajęte nazwy
+    return propagate_constants(ast, specialise=False)
+
+
+# (nazwa, rodzaj, najniższy poziom -O, funkcja) w kolejności wykonania
+PASSES = [
+    ('fold', 'ast', 1, fold_constants),
+    ('inline', 'ast', 2, inline_procedures),
+    ('propagate', 'ast', 2, propagate_constants),
+    ('unroll', 'ast', 2, unroll_loops),
+    ('propagate', 'ast', 2, propagate_again),
+    ('licm', 'ast', 2, hoist_invariants),
+    ('cse', 'ast', 2, number_values),
+    ('dce', 'ast', 2, eliminate_dead_code),
+    ('layout', 'ir', 1, layout_blocks),
+    ('peephole', 'ir', 1, optimize),
+]
+
+PASS_NAMES = list(dict.fromkeys(name for name, _, _, _ in PASSES))
+
+# Przebiegi, które przyjmują profil wykonania jako argument profile
+PROFILE_PASSES = {'inline'}
+
+MAX_LEVEL = 2
+
+
+def select_passes(level, enabled=(), disabled=()):
+    """Nazwy przebiegów dla poziomu level, z włączonymi enabled i wyłączonymi disabled."""
+    for name in list(enabled) + list(disabled):
+        if name not in PASS_NAMES:
+            raise Exception(f"Nieznany przebieg {name} (dostępne: {', '.join(PASS_NAMES)})")
+    selected = {name for name, _, min_level, _ in PASSES if min_level <= level}
+    return (selected | set(enabled)) - set(disabled)
+
+
+def add_pass_arguments(args):
+    # Opcje wyboru przebiegów wspólne dla kompilator.py i profiler.py
+    args.add_argument('-O', dest='level', type=int, choices=range(MAX_LEVEL + 1), default=MAX_LEVEL,
+                      help=f"poziom optymalizacji (domyślnie {MAX_LEVEL})")
+    args.add_argument('--enable', action='append', default=[], metavar='PRZEBIEG',
+                      help=f"włącza przebieg: {', '.join(PASS_NAMES)}")
+    args.add_argument('--disable', action='append', default=[], metavar='PRZEBIEG',
+                      help="wyłącza przebieg")
+    args.add_argument('--profile-use', metavar='PLIK',
+                      help="steruje optymalizacjami wykonaniami linii zapisanymi przez profiler.py --counts")
+
+
+def generate(ast, profile=None):
+    gen = CodeGenerator(layout=plan_memory(ast), profile=profile)
+    gen.walk(ast)
+    return gen
+
+
+def run_passes(ast, selected, profile=None):
+    """Zwraca (generator z ostatecznym kodem w instructions, raport) - raport to lista wierszy
+    (nazwa, czas w sekundach, usunięte rozkazy, oszczędzony szacowany koszt)."""
+    report = []
+
+    # Pierwsze generowanie zgłasza błędy semantyczne programu przed optymalizacją
+    start = time.perf_counter()
+    gen = generate(ast, profile)
+    report.append(('generator', time.perf_counter() - start, 0, 0))
+
+    for name, kind, _, run in PASSES:
+        if name not in selected:
+            continue
+        before = gen.instructions
+        start = time.perf_counter()
+        if kind == 'ast':
+            ast = run(ast, profile=profile) if name in PROFILE_PASSES else run(ast)
+            elapsed = time.perf_counter() - start
+            gen = generate(ast, profile)
+        else:
+            code, _ = run(gen.instructions)
+            elapsed = time.perf_counter() - start
+            gen.instructions = code
+        after = gen.instructions
+        report.append((name, elapsed,
+                       len(instructions_of(before)) - len(instructions_of(after)),
+                       estimated_cost(before) - estimated_cost(after)))
+
+    gen.locate_procedures()
+    return gen, report
+
+
+def format_report(report):
+    # Ujemne wartości oznaczają przebieg, który kod powiększył (np. rozwijanie pętli)
+    lines = [f"{'przebieg':12}{'czas [ms]':>12}{'usunięte rozkazy':>18}{'oszczędzony koszt':>19}"]
+    for name, elapsed, removed, saved in report:
+        lines.append(f"{name:12}{elapsed * 1000:12.2f}{removed:18}{saved:19}")
+    total = [sum(row[i] for row in report) for i in range(1, 4)]
+    lines.append(f"{'razem':12}{total[0] * 1000:12.2f}{total[1]:18}{total[2]:19}")
+    return "\n".join(lines)
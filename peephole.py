@@ -0,0 +1,110 @@
+"""Optymalizacja przez szparkę na kodzie pośrednim wygenerowanym przez CodeGenerator."""
+from vm import COSTS
+from ir import (Label, referenced_labels, split_blocks, join_blocks, reachable_blocks,
+                LOAD, STORE, RLOAD, RSTORE, ADD, SUB, SWP, RST, INC, DEC, SHL, SHR,
+                READ, WRITE, JUMP, JPOS, JZERO, CALL, RTRN)
+
+# Rozkazy na ra bez efektów ubocznych - zbędne, jeśli wynik zostanie nadpisany
+PURE_A_WRITES = {RST, INC, DEC, SHL, SHR}
+
+
+def reads_a(op, arg):
+    if op in (WRITE, STORE, RSTORE, ADD, SUB, SWP, JPOS, JZERO, RTRN):
+        return True
+    return op in (INC, DEC, SHL, SHR, RLOAD) and arg == 'a'
+
+
+def overwrites_a(op, arg):
+    # CALL zapisuje w ra adres powrotu, więc wcześniejsza wartość ra ginie
+    if op in (LOAD, READ, CALL):
+        return True
+    if op == RLOAD:
+        return arg != 'a'
+    return op == RST and arg == 'a'
+
+
+def is_dead_a_write(op, arg):
+    # Rozkaz bez efektów ubocznych, którego jedynym wynikiem jest ra
+    if op in (LOAD, RLOAD, ADD, SUB):
+        return True
+    return op in PURE_A_WRITES and arg == 'a'
+
+
+def find_removable(instructions):
+    # Indeksy rozkazów bloku podstawowego, które można usunąć
+    remove = set()
+
+    for i in range(len(instructions) - 1):
+        if i in remove:
+            continue
+        op, arg = instructions[i]
+
+        # SWP x; SWP x
+        if op == SWP and instructions[i + 1] == (SWP, arg):
+            remove.update([i, i + 1])
+
+        # STORE j; LOAD j
+        elif op == STORE and instructions[i + 1] == (LOAD, arg):
+            remove.add(i + 1)
+
+    # Zapisy do ra nadpisane przed odczytem; na końcu bloku ra uznajemy za żywe
+    a_dead = False
+    for i in range(len(instructions) - 1, -1, -1):
+        if i in remove:
+            continue
+        op, arg = instructions[i]
+        if a_dead and is_dead_a_write(op, arg):
+            remove.add(i)
+        elif reads_a(op, arg):
+            a_dead = False
+        elif overwrites_a(op, arg):
+            a_dead = True
+
+    return remove
+
+
+def optimize(code):
+    """Zwraca (nowy kod, statystyki) - liczbę usuniętych rozkazów i ich łączny koszt."""
+    stats = {'removed': 0, 'cost': 0}
+
+    changed = True
+    while changed:
+        changed = False
+        targets = referenced_labels(code)
+        code = [item for item in code if not isinstance(item, Label) or item in targets]
+        blocks = split_blocks(code)
+
+        # Bloki, do których nie da się dojść, np. procedury, których nikt nie wywołuje
+        reachable = reachable_blocks(blocks)
+        if len(reachable) < len(blocks):
+            changed = True
+            for n, block in enumerate(blocks):
+                if n not in reachable:
+                    stats['removed'] += len(block.instructions)
+                    stats['cost'] += sum(COSTS[op] for op, _ in block.instructions)
+            blocks = [block for n, block in enumerate(blocks) if n in reachable]
+
+        for n, block in enumerate(blocks):
+            remove = find_removable(block.instructions)
+
+            # JUMP do bloku, który i tak następuje zaraz po nim
+            last = block.last()
+            if (last is not None and last[0] == JUMP and n + 1 < len(blocks)
+                    and last[1] in blocks[n + 1].labels):
+                remove.add(len(block.instructions) - 1)
+
+            if not remove:
+                continue
+            changed = True
+            kept = []
+            for i, instruction in enumerate(block.instructions):
+                if i in remove:
+                    stats['removed'] += 1
+                    stats['cost'] += COSTS[instruction[0]]
+                else:
+                    kept.append(instruction)
+            block.instructions = kept
+
+        code = join_blocks(blocks)
+
+    return code, stats
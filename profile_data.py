@@ -0,0 +1,47 @@
+"""Profil wykonania zapisany przez profiler.py --counts.
+
+Każda linia pliku to 'procedura linia wykonania koszt'. Wykonania instrukcji są
+kluczowane nazwą procedury (zasięgiem z ir.Instruction) i numerem linii źródła, więc
+profil zebrany z innymi opcjami przebiegów nadal pasuje do programu. Kopie procedur
+z propagation.py (nazwa__N) dzielą profil z procedurą, z której powstały.
+"""
+import re
+
+CLONE_SUFFIX = re.compile(r'__\d+$')
+
+
+def base_scope(scope):
+    return CLONE_SUFFIX.sub('', scope)
+
+
+class ExecutionProfile:
+    def __init__(self, counts):
+        # (procedura, linia) -> liczba wykonań instrukcji
+        self.counts = counts
+
+    def executions(self, scope, lineno):
+        """Liczba wykonań instrukcji z linii lineno w procedurze scope albo None bez danych."""
+        if scope is None:
+            return None
+        return self.counts.get((base_scope(scope), lineno))
+
+    def first_executions(self, scope, commands):
+        # Wykonania pierwszej instrukcji commands, dla której powstaje kod
+        for cmd in commands:
+            if cmd[0] not in ['DISCARD', 'INLINED']:
+                return self.executions(scope, cmd[-1])
+        return None
+
+
+def load_profile(path):
+    counts = {}
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) != 4 or not all(field.isdigit() for field in fields[1:]):
+                raise Exception(f"Błąd w profilu {path}, linia {number}: Oczekiwano 'procedura linia wykonania koszt'")
+            key = (base_scope(fields[0]), int(fields[1]))
+            counts[key] = counts.get(key, 0) + int(fields[2])
+    return ExecutionProfile(counts)
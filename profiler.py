@@ -0,0 +1,204 @@
+"""Profil wykonania programu na symulatorze z vm.py.
+
+Program jest kompilowany jak w kompilator.py i wykonywany z danymi ze standardowego
+wejścia. Liczby wykonań i koszt są sumowane dla rozkazów, bloków podstawowych, linii
+źródła (z ir.Instruction) i procedur; wejście do procedury rozpoznawane jest po adresie
+SymbolTable.procedures[...]['start_address']. Stosy zwinięte (ramki rozdzielone ';' i
+koszt w jednej linii) przyjmują narzędzia rysujące wykresy płomieniowe.
+
+Użycie: python profiler.py <program> [opcje] < dane
+"""
+import argparse
+import sys
+from vm import COSTS, OPCODES, run
+from ir import Label, instructions_of, label_addresses, split_blocks, assemble, CALL
+from generator import DIVISION_SCOPE
+from passes import add_pass_arguments, select_passes
+from kompilator import compile_source
+from profile_data import load_profile
+
+# Ramka kodu startowego, który nie należy do żadnej procedury
+START_FRAME = '(start)'
+
+# Domyślnie tyle najdroższych rozkazów i bloków trafia do tabel
+DEFAULT_TOP = 20
+
+
+def static_frames(instruction):
+    # Zasięg i zagnieżdżone instrukcje źródła, z których pochodzi rozkaz
+    frames = [instruction.scope or START_FRAME]
+    frames += [f"{tag}:{lineno}" for tag, lineno in instruction.frames[1:]]
+    return frames
+
+
+class Profile:
+    def __init__(self, gen, result):
+        self.code = instructions_of(gen.instructions)
+        self.blocks = split_blocks(gen.instructions)
+        self.result = result
+
+        # Adres wejścia -> nazwa procedury
+        self.entries = {}
+        for name, proc_info in gen.symbols.procedures.items():
+            if proc_info.get('start_address') is not None:
+                self.entries[proc_info['start_address']] = name
+        if gen.div_address is not None:
+            self.entries[gen.div_address] = DIVISION_SCOPE
+        self.addresses = label_addresses(gen.instructions)
+
+    def cost(self, address, count):
+        return count * COSTS[self.code[address][0]]
+
+    def callee(self, address):
+        # Nazwa procedury wywoływanej rozkazem CALL spod address
+        return self.entries.get(self.addresses.get(self.code[address][1]), '?')
+
+    def instructions(self):
+        # (adres, rozkaz, wykonania, koszt) dla wykonanych rozkazów
+        rows = []
+        for address, count in enumerate(self.result.hits):
+            if count:
+                op, arg = self.code[address]
+                if isinstance(arg, Label):
+                    arg = self.addresses[arg]
+                text = OPCODES[op] if arg is None else f"{OPCODES[op]} {arg}"
+                rows.append((address, text, count, self.cost(address, count)))
+        return rows
+
+    def basic_blocks(self):
+        # (pierwszy adres, liczba rozkazów, wejścia, koszt) dla wykonanych bloków
+        rows = []
+        address = 0
+        for block in self.blocks:
+            size = len(block.instructions)
+            if size and self.result.hits[address]:
+                cost = sum(self.cost(a, self.result.hits[a]) for a in range(address, address + size))
+                rows.append((address, size, self.result.hits[address], cost))
+            address += size
+        return rows
+
+    def lines(self):
+        # (zasięg, linia) -> [wykonania, kroki, koszt]; wykonanie instrukcji to wykonanie
+        # jej pierwszego rozkazu, osobno dla każdego miejsca, w które trafił jej kod
+        first = {}
+        for address, instruction in enumerate(self.code):
+            first.setdefault((instruction.scope, instruction.statement), address)
+
+        rows = {}
+        for address, instruction in enumerate(self.code):
+            count = self.result.hits[address]
+            row = rows.setdefault((instruction.scope, instruction.lineno), [0, 0, 0])
+            if first[(instruction.scope, instruction.statement)] == address:
+                row[0] += count
+            row[1] += count
+            row[2] += self.cost(address, count)
+        return rows
+
+    def procedures(self):
+        # nazwa -> [wywołania, koszt własny, koszt łącznie z wywoływanymi procedurami]
+        rows = {}
+        for address, instruction in enumerate(self.code):
+            row = rows.setdefault(instruction.scope or START_FRAME, [0, 0, 0])
+            row[1] += self.cost(address, self.result.hits[address])
+            if instruction[0] == CALL and self.result.hits[address]:
+                rows.setdefault(self.callee(address), [0, 0, 0])[0] += self.result.hits[address]
+
+        for stack, hits in self.result.contexts.items():
+            cost = sum(self.cost(address, count) for address, count in enumerate(hits) if count)
+            for name in {self.callee(address) for address in stack}:
+                rows[name][2] += cost
+        # Kod startowy wykonuje się raz przed programem głównym
+        start = rows.pop(START_FRAME, [0, 0, 0])
+        if 'MAIN' in rows:
+            rows['MAIN'][0] = 1
+            rows['MAIN'][2] = self.result.cost - start[1]
+        rows[START_FRAME] = [1, start[1], start[1]]
+        return rows
+
+    def collapsed(self):
+        """Linie 'ramka;ramka;... koszt' - stos wywołań z miejscami w źródle."""
+        stacks = {}
+        for stack, hits in self.result.contexts.items():
+            prefix = []
+            for address in stack:
+                prefix += static_frames(self.code[address])
+            for address, count in enumerate(hits):
+                if count:
+                    key = ';'.join(prefix + static_frames(self.code[address]))
+                    stacks[key] = stacks.get(key, 0) + self.cost(address, count)
+        return [f"{key} {cost}" for key, cost in sorted(stacks.items()) if cost]
+
+    def counts(self):
+        """Linie 'zasięg linia wykonania koszt' - zapis profilu dla kompilator.py --profile-use."""
+        rows = self.lines()
+        return [f"{scope} {lineno} {executions} {cost}"
+                for (scope, lineno), (executions, _, cost) in sorted(rows.items(), key=lambda r: (str(r[0][0]), r[0][1] or 0))
+                if scope is not None and lineno is not None]
+
+
+def format_profile(profile, source, top=DEFAULT_TOP):
+    source_lines = source.splitlines()
+
+    def text(lineno):
+        if lineno is None or not 0 < lineno <= len(source_lines):
+            return ''
+        return source_lines[lineno - 1].strip()[:40]
+
+    result = profile.result
+    report = [f"Koszt: {result.cost} (w tym i/o: {result.io_cost}), wykonane rozkazy: {result.steps}", ""]
+
+    report.append(f"{'procedura':16}{'wywołania':>11}{'koszt własny':>14}{'łącznie':>14}")
+    for name, (calls, own, total) in sorted(profile.procedures().items(), key=lambda r: -r[1][2]):
+        report.append(f"{name:16}{calls:11}{own:14}{total:14}")
+
+    report += ["", f"{'zasięg':16}{'linia':>6}{'wykonania':>11}{'rozkazy':>12}{'koszt':>14}  źródło"]
+    for (scope, lineno), (executions, steps, cost) in sorted(profile.lines().items(), key=lambda r: -r[1][2]):
+        if steps:
+            label = lineno if lineno is not None else '-'
+            report.append(f"{scope or START_FRAME:16}{label:>6}{executions:11}{steps:12}{cost:14}  {text(lineno)}")
+
+    report += ["", f"Bloki podstawowe ({top} najdroższych):",
+               f"{'adres':>6}{'rozkazy':>9}{'wejścia':>11}{'koszt':>14}"]
+    for address, size, entries, cost in sorted(profile.basic_blocks(), key=lambda r: -r[3])[:top]:
+        report.append(f"{address:6}{size:9}{entries:11}{cost:14}")
+
+    report += ["", f"Rozkazy ({top} najdroższych):", f"{'adres':>6}  {'rozkaz':12}{'wykonania':>11}{'koszt':>14}"]
+    for address, instruction, count, cost in sorted(profile.instructions(), key=lambda r: -r[3])[:top]:
+        report.append(f"{address:6}  {instruction:12}{count:11}{cost:14}")
+    return "\n".join(report)
+
+
+def main():
+    args = argparse.ArgumentParser(description="Profil programu wykonanego na symulatorze vm.py")
+    args.add_argument('input', help="ścieżka do programu źródłowego")
+    add_pass_arguments(args)
+    args.add_argument('--top', type=int, default=DEFAULT_TOP,
+                      help=f"liczba najdroższych bloków i rozkazów w tabelach (domyślnie {DEFAULT_TOP})")
+    args.add_argument('--collapsed', metavar='PLIK', help="zapisuje stosy zwinięte do wykresu płomieniowego")
+    args.add_argument('--counts', metavar='PLIK', help="zapisuje wykonania linii dla kompilator.py --profile-use")
+    options = args.parse_args()
+
+    with open(options.input, 'r') as f:
+        source = f.read()
+
+    profile = load_profile(options.profile_use) if options.profile_use else None
+    gen, _ = compile_source(source, select_passes(options.level, options.enable, options.disable), profile)
+    if gen is None:
+        return
+
+    result = run(assemble(gen.instructions), sys.stdin.read().split(), profile=True)
+    profile = Profile(gen, result)
+
+    for value in result.outputs:
+        print(f"> {value}")
+    print(format_profile(profile, source, options.top))
+
+    if options.collapsed:
+        with open(options.collapsed, 'w') as f:
+            f.write("\n".join(profile.collapsed()) + "\n")
+    if options.counts:
+        with open(options.counts, 'w') as f:
+            f.write("\n".join(profile.counts()) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Propagacja stałych w całym programie.
+
+Przebieg śledzi wartości zmiennych (i elementów tablic o stałych indeksach) znane w
+czasie kompilacji: przez przypisania, rozgałęzienia i pętle, aż do punktu stałego.
+Znane wartości zastępują odczyty, a wyrażenia i warunki są zwijane jak w folding.py -
+gałęzie, które się nie wykonają, trafiają do DISCARD. Wywołanie ze stałymi argumentami
+na miejscach parametrów I trafia do kopii procedury __N, w której te parametry są
+stałymi. Zapis, READ i CALL unieważniają wiedzę o zmienianych zmiennych.
+"""
+from folding import fold_expression, fold_condition
+
+# Najwięcej tylu wyspecjalizowanych kopii jednej procedury
+MAX_CLONES = 4
+
+
+def meet(first, second):
+    # Wartości znane w obu stanach i w obu takie same
+    return {key: value for key, value in first.items() if second.get(key, value + 1) == value}
+
+
+class ConstantPropagator:
+    def __init__(self, ast, specialise=True):
+        self.procedures = {proc[1][0]: proc for proc in ast[1]}
+        # Czy wywołania ze stałymi argumentami dostają kopie procedur
+        self.specialise_calls = specialise
+        # (nazwa, stałe parametry) -> nazwa kopii
+        self.clones = {}
+        self.clone_counts = {}
+        self.clone_procedures = []
+        # Przebieg tylko po stan w pętli - bez nowych kopii procedur
+        self.speculative = False
+        # Bieżący zasięg: typy parametrów i zakresy tablic (None dla T)
+        self.params = {}
+        self.arrays = {}
+
+    def value(self, node, env):
+        # node z odczytami znanych zmiennych zastąpionymi stałymi
+        if node[0] == 'ID':
+            if node[1] in env:
+                return ('NUM', str(env[node[1]]), node[2])
+            return node
+        if node[0] == 'ARRAY_ID':
+            node = self.target(node, env)
+            index = node[2]
+            if index[0] == 'NUM' and (node[1], int(index[1])) in env:
+                return ('NUM', str(env[(node[1], int(index[1]))]), node[3])
+            return node
+        if node[0] == 'BINARY_OP':
+            return fold_expression(('BINARY_OP', node[1], self.value(node[2], env),
+                                    self.value(node[3], env), node[4]))
+        return node
+
+    def target(self, node, env):
+        # Identyfikator ze znanym indeksem zastąpionym stałą
+        if node[0] == 'ID':
+            return node
+        index = self.value(node[2], env)
+        # Stały indeks poza zakresem tablicy byłby błędem kompilacji, którego wcześniej nie było
+        bounds = self.arrays.get(node[1])
+        if index[0] == 'NUM' and bounds is not None and not bounds[0] <= int(index[1]) <= bounds[1]:
+            index = node[2]
+        return ('ARRAY_ID', node[1], index, node[3])
+
+    def condition(self, cond, env):
+        return ('CONDITION', cond[1], self.value(cond[2], env), self.value(cond[3], env), cond[4])
+
+    def forget(self, env, name):
+        # Usuwa wiedzę o name; parametry i tablice T procedury mogą być aliasami
+        names = {name}
+        if name in self.params:
+            is_array = self.params[name] == 'T'
+            names |= {p_name for p_name, p_type in self.params.items() if (p_type == 'T') == is_array}
+        for key in list(env):
+            if key in names or (isinstance(key, tuple) and key[0] in names):
+                del env[key]
+
+    def assign(self, target, value, env):
+        if target[0] == 'ID':
+            self.forget(env, target[1])
+            if value is not None and value[0] == 'NUM':
+                env[target[1]] = int(value[1])
+            return
+
+        name, index = target[1], target[2]
+        if index[0] != 'NUM':
+            self.forget(env, name)
+            return
+        key = (name, int(index[1]))
+        if name in self.params:
+            self.forget(env, name)
+        env.pop(key, None)
+        if value is not None and value[0] == 'NUM':
+            env[key] = int(value[1])
+
+    def commands(self, commands, env):
+        """Zwraca instrukcje po propagacji; env jest aktualizowany do stanu za commands."""
+        result = []
+        for cmd in commands:
+            result.extend(self.command(cmd, env))
+        return result
+
+    def command(self, cmd, env):
+        tag = cmd[0]
+
+        if tag == 'ASSIGN':
+            target = self.target(cmd[1], env)
+            expr = self.value(cmd[2], env)
+            self.assign(target, expr, env)
+            return [('ASSIGN', target, expr, cmd[3])]
+
+        elif tag == 'READ':
+            target = self.target(cmd[1], env)
+            self.assign(target, None, env)
+            return [('READ', target, cmd[2])]
+
+        elif tag == 'WRITE':
+            return [('WRITE', self.value(cmd[1], env), cmd[2])]
+
+        elif tag == 'CALL':
+            return [self.call(cmd, env)]
+
+        elif tag == 'IF':
+            cond = self.condition(cmd[1], env)
+            value = fold_condition(cond)
+            if value is True:
+                return self.commands(cmd[2], env)
+            if value is False:
+                return [('DISCARD', cmd[2], cmd[3])]
+            then_env = dict(env)
+            body = self.commands(cmd[2], then_env)
+            env_meet = meet(env, then_env)
+            env.clear()
+            env.update(env_meet)
+            return [('IF', cond, body, cmd[3])]
+
+        elif tag == 'IF_ELSE':
+            cond = self.condition(cmd[1], env)
+            value = fold_condition(cond)
+            if value is True:
+                return self.commands(cmd[2], env) + [('DISCARD', cmd[3], cmd[4])]
+            if value is False:
+                return [('DISCARD', cmd[2], cmd[4])] + self.commands(cmd[3], env)
+            then_env, else_env = dict(env), dict(env)
+            then_body = self.commands(cmd[2], then_env)
+            else_body = self.commands(cmd[3], else_env)
+            env_meet = meet(then_env, else_env)
+            env.clear()
+            env.update(env_meet)
+            return [('IF_ELSE', cond, then_body, else_body, cmd[4])]
+
+        elif tag == 'WHILE':
+            if fold_condition(self.condition(cmd[1], env)) is False:
+                return [('DISCARD', cmd[2], cmd[3])]
+            head = self.loop_head(cmd[2], env)
+            cond = self.condition(cmd[1], head)
+            body = self.commands(cmd[2], dict(head))
+            env.clear()
+            env.update(head)
+            return [('WHILE', cond, body, cmd[3])]
+
+        elif tag == 'REPEAT':
+            end = dict(env)
+            self.speculate(cmd[1], end)
+            if fold_condition(self.condition(cmd[2], end)) is True:
+                # Pętla wykona się dokładnie raz
+                return self.commands(cmd[1], env)
+            head = self.loop_head(cmd[1], env)
+            end = dict(head)
+            body = self.commands(cmd[1], end)
+            cond = self.condition(cmd[2], end)
+            env.clear()
+            env.update(end)
+            return [('REPEAT', body, cond, cmd[3])]
+
+        elif tag in ['FOR_TO', 'FOR_DOWNTO']:
+            start = self.value(cmd[2], env)
+            end = self.value(cmd[3], env)
+            if start[0] == 'NUM' and end[0] == 'NUM':
+                first, last = int(start[1]), int(end[1])
+                if (tag == 'FOR_TO' and first > last) or (tag == 'FOR_DOWNTO' and first < last):
+                    return [('DISCARD', [cmd], cmd[5])]
+            head = self.loop_head(cmd[4], env)
+            body = self.commands(cmd[4], dict(head))
+            env.clear()
+            env.update(head)
+            return [(tag, cmd[1], start, end, body, cmd[5])]
+
+        return [cmd]
+
+    def speculate(self, commands, env):
+        # Tylko zmiana env, bez tworzenia kopii procedur
+        speculative, self.speculative = self.speculative, True
+        self.commands(commands, env)
+        self.speculative = speculative
+
+    def loop_head(self, body, env):
+        # Stan na początku obrotu: wartości znane przy wejściu i po każdym kolejnym obrocie
+        head = dict(env)
+        while True:
+            end = dict(head)
+            self.speculate(body, end)
+            new_head = meet(env, end)
+            if new_head == head:
+                return head
+            head = new_head
+
+    def call(self, cmd, env):
+        name, args = cmd[1], cmd[2]
+        proc = self.procedures.get(name)
+
+        if proc is not None and len(args) == len(proc[1][1]):
+            constants = []
+            for (arg_name, _), (p_type, p_name, _) in zip(args, proc[1][1]):
+                if p_type == 'I' and arg_name in env:
+                    constants.append((p_name, env[arg_name]))
+            if constants and self.specialise_calls and not self.speculative:
+                clone = self.specialise(name, tuple(constants))
+                if clone is not None:
+                    cmd = ('CALL', clone, args, cmd[3])
+
+        # Procedura może zmienić każdy argument przekazany przez referencję
+        types = [p_type for p_type, _, _ in proc[1][1]] if proc else []
+        for i, (arg_name, _) in enumerate(args):
+            if i >= len(types) or types[i] != 'I':
+                self.forget(env, arg_name)
+        return cmd
+
+    def specialise(self, name, constants):
+        # Nazwa kopii procedury name ze stałymi parametrami constants albo None
+        key = (name, constants)
+        if key in self.clones:
+            return self.clones[key]
+        count = self.clone_counts.get(name, 0)
+        if count >= MAX_CLONES:
+            return None
+
+        self.clone_counts[name] = count + 1
+        clone = f"{name}__{count + 1}"
+        self.clones[key] = clone
+
+        proc = self.procedures[name]
+        scope = (self.params, self.arrays)
+        commands = self.scope(proc, dict(constants))
+        self.params, self.arrays = scope
+        self.clone_procedures.append(('PROCEDURE', (clone, proc[1][1]), proc[2], commands, proc[4]))
+        return clone
+
+    def scope(self, node, env):
+        if node[0] == 'PROCEDURE':
+            params, declarations, commands = node[1][1], node[2], node[3]
+        else:
+            params, declarations, commands = [], node[1], node[2]
+
+        self.params = {p_name: p_type for p_type, p_name, _ in params}
+        self.arrays = {p_name: None for p_type, p_name, _ in params if p_type == 'T'}
+        for decl in declarations:
+            if decl[0] == 'ARRAY':
+                self.arrays[decl[1]] = (int(decl[2]), int(decl[3]))
+        return self.commands(commands, env)
+
+
+def propagate_constants(ast, specialise=True):
+    propagator = ConstantPropagator(ast, specialise)
+
+    procedures = []
+    for proc in ast[1]:
+        procedures.append(('PROCEDURE', proc[1], proc[2], propagator.scope(proc, {}), proc[4]))
+
+    main = ast[2]
+    main = ('MAIN', main[1], propagator.scope(main, {}), main[3])
+    return ('PROGRAM_ALL', procedures + propagator.clone_procedures, main)
@@ -0,0 +1,156 @@
+"""Pełne rozwijanie pętli FOR o stałych granicach.
+
+Pętla z niewielką liczbą obrotów, której ciało zmieści się w budżecie rozmiaru kodu,
+zastępowana jest kopiami ciała, w których iterator jest stałą. Kopie są zwijane przez
+folding.py, więc t[i] staje się odwołaniem pod stały adres, a warunki zależne od i
+znikają. Oryginalna pętla zostaje w węźle DISCARD - generator sprawdza ją semantycznie,
+ale nie emituje dla niej kodu. Wartości znane w jednej kopii ciała przenosi do następnych
+ponowna propagacja stałych, którą menedżer przebiegów uruchamia po tym przebiegu.
+
+Częściowe rozwijanie nie jest tu stosowane: FOR nie ma kroku innego niż 1, a pętla WHILE
+z kopiami ciała potrzebowałaby zapisu iteratora do pamięci w każdej kopii, co kosztuje
+więcej niż oszczędzony narzut obrotu pętli FOR.
+"""
+from folding import fold_commands
+from inline import command_count
+
+# Łączna liczba instrukcji we wszystkich kopiach ciała jednej pętli
+UNROLL_BUDGET = 64
+
+# Najwięcej tylu obrotów rozwijamy niezależnie od rozmiaru ciała
+MAX_UNROLL_TRIPS = 16
+
+
+def substitute(node, name, value):
+    # Kopia node z odczytami zmiennej name zastąpionymi stałą value
+    if isinstance(node, list):
+        return [substitute(n, name, value) for n in node]
+    if not isinstance(node, tuple):
+        return node
+    if node[0] == 'ID':
+        return ('NUM', str(value), node[2]) if node[1] == name else node
+    if node[0] in ['ASSIGN', 'READ'] and node[1][0] == 'ID':
+        # Cel przypisania nie jest odczytem
+        return (node[0], node[1]) + tuple(substitute(n, name, value) for n in node[2:])
+    return tuple([node[0]] + [substitute(n, name, value) for n in node[1:]])
+
+
+def blocks_unrolling(node, iterator):
+    # Iterator modyfikowany albo przekazywany do procedury musi pozostać zmienną
+    if isinstance(node, list):
+        return any(blocks_unrolling(n, iterator) for n in node)
+    if not isinstance(node, tuple):
+        return False
+    tag = node[0]
+    if tag in ['ASSIGN', 'READ'] and node[1][0] == 'ID' and node[1][1] == iterator:
+        return True
+    if tag == 'CALL' and iterator in [arg_name for arg_name, _ in node[2]]:
+        return True
+    if tag in ['FOR_TO', 'FOR_DOWNTO'] and node[1] == iterator:
+        return True
+    return any(blocks_unrolling(n, iterator) for n in node[1:])
+
+
+def indexed_arrays(node, iterator, found):
+    # Tablice indeksowane bezpośrednio iteratorem
+    if isinstance(node, list):
+        for n in node:
+            indexed_arrays(n, iterator, found)
+        return
+    if not isinstance(node, tuple):
+        return
+    if node[0] == 'ARRAY_ID' and node[2][0] == 'ID' and node[2][1] == iterator:
+        found.add(node[1])
+    for n in node[1:]:
+        indexed_arrays(n, iterator, found)
+
+
+def drop_markers(commands, iterator):
+    # Węzły INLINED z iteratorem wśród argumentów, także w zagnieżdżonych instrukcjach -
+    # sprawdza je pętla w DISCARD
+    result = []
+    for cmd in commands:
+        if cmd[0] == 'INLINED' and iterator in [arg_name for arg_name, _ in cmd[2]]:
+            continue
+        result.append(tuple(drop_markers(n, iterator) if isinstance(n, list) else n for n in cmd))
+    return result
+
+
+class Unroller:
+    def __init__(self, budget):
+        self.budget = budget
+        # Zakresy tablic bieżącego zasięgu; parametry T nie mają znanego zakresu
+        self.arrays = {}
+
+    def trips(self, node):
+        # Kolejne wartości iteratora albo None, jeśli granice nie są stałe
+        start, end = node[2], node[3]
+        if start[0] != 'NUM' or end[0] != 'NUM':
+            return None
+        first, last = int(start[1]), int(end[1])
+        if node[0] == 'FOR_TO':
+            return range(first, last + 1)
+        return range(first, last - 1, -1)
+
+    def can_unroll(self, node, body):
+        values = self.trips(node)
+        if values is None or not values or len(values) > MAX_UNROLL_TRIPS:
+            return False
+        if len(values) * command_count(body) > self.budget:
+            return False
+        if blocks_unrolling(body, node[1]):
+            return False
+
+        # Stały indeks poza zakresem tablicy byłby błędem kompilacji
+        arrays = set()
+        indexed_arrays(body, node[1], arrays)
+        for name in arrays:
+            bounds = self.arrays.get(name)
+            if bounds is not None and (min(values) < bounds[0] or max(values) > bounds[1]):
+                return False
+        return True
+
+    def unroll(self, node, body):
+        result = [('DISCARD', [node], node[5])]
+        for value in self.trips(node):
+            copy = substitute(drop_markers(body, node[1]), node[1], value)
+            result.extend(fold_commands(copy))
+        return result
+
+    def commands(self, commands):
+        result = []
+        for cmd in commands:
+            tag = cmd[0]
+            if tag in ['FOR_TO', 'FOR_DOWNTO']:
+                body = self.commands(cmd[4])
+                if self.can_unroll(cmd, body):
+                    result.extend(self.unroll(cmd, body))
+                else:
+                    result.append((tag, cmd[1], cmd[2], cmd[3], body, cmd[5]))
+            elif tag == 'IF':
+                result.append((tag, cmd[1], self.commands(cmd[2]), cmd[3]))
+            elif tag == 'IF_ELSE':
+                result.append((tag, cmd[1], self.commands(cmd[2]), self.commands(cmd[3]), cmd[4]))
+            elif tag == 'WHILE':
+                result.append((tag, cmd[1], self.commands(cmd[2]), cmd[3]))
+            elif tag == 'REPEAT':
+                result.append((tag, self.commands(cmd[1]), cmd[2], cmd[3]))
+            else:
+                result.append(cmd)
+        return result
+
+    def scope(self, declarations, commands):
+        self.arrays = {decl[1]: (int(decl[2]), int(decl[3])) for decl in declarations if decl[0] == 'ARRAY'}
+        return self.commands(commands)
+
+
+def unroll_loops(ast, budget=UNROLL_BUDGET):
+    unroller = Unroller(budget)
+
+    procedures = []
+    for proc in ast[1]:
+        procedures.append(('PROCEDURE', proc[1], proc[2], unroller.scope(proc[2], proc[3]), proc[4]))
+
+    main = ast[2]
+    main = ('MAIN', main[1], unroller.scope(main[1], main[2]), main[3])
+    return ('PROGRAM_ALL', procedures, main)
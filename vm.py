@@ -0,0 +1,184 @@
+import sys
+
+# Lista rozkazów maszyny wirtualnej w kolejności numeracji opkodów
+OPCODES = (
+    'READ', 'WRITE', 'LOAD', 'STORE', 'RLOAD', 'RSTORE', 'ADD', 'SUB', 'SWP',
+    'RST', 'INC', 'DEC', 'SHL', 'SHR', 'JUMP', 'JPOS', 'JZERO', 'CALL', 'RTRN', 'HALT',
+)
+OPCODE = {name: i for i, name in enumerate(OPCODES)}
+
+(READ, WRITE, LOAD, STORE, RLOAD, RSTORE, ADD, SUB, SWP,
+ RST, INC, DEC, SHL, SHR, JUMP, JPOS, JZERO, CALL, RTRN, HALT) = range(len(OPCODES))
+
+# Koszt wykonania rozkazu (Tabela 2 specyfikacji)
+COSTS = (100, 100, 50, 50, 50, 50, 5, 5, 5, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0)
+
+REGISTERS = 'abcdefgh'
+REGISTER_OPS = {RLOAD, RSTORE, ADD, SUB, SWP, RST, INC, DEC, SHL, SHR}
+ADDRESS_OPS = {LOAD, STORE, JUMP, JPOS, JZERO, CALL}
+
+
+class RunResult:
+    def __init__(self, outputs, hits, ops, contexts=None):
+        self.outputs = outputs
+        self.hits = hits
+        # Stos adresów rozkazów CALL -> liczba wykonań każdego rozkazu w tym kontekście
+        self.contexts = contexts
+        self.counts = {}
+        self.cost = 0
+        self.io_cost = 0
+        for pc, n in enumerate(hits):
+            if n:
+                op = ops[pc]
+                self.counts[OPCODES[op]] = self.counts.get(OPCODES[op], 0) + n
+                self.cost += n * COSTS[op]
+                if op in (READ, WRITE):
+                    self.io_cost += n * COSTS[op]
+
+    @property
+    def steps(self):
+        return sum(self.hits)
+
+
+def decode(instructions):
+    """Zamienia tekst programu na tablice opkodów i argumentów"""
+    ops = []
+    args = []
+    for lineno, line in enumerate(instructions):
+        line = line.split('#', 1)[0].split()
+        if not line:
+            continue
+        name = line[0]
+        if name not in OPCODE:
+            raise Exception(f"Błąd w rozkazie {lineno}: Nieznany rozkaz '{name}'")
+        op = OPCODE[name]
+        arg = 0
+        if op in REGISTER_OPS:
+            if len(line) != 2 or line[1] not in REGISTERS:
+                raise Exception(f"Błąd w rozkazie {lineno}: Niepoprawny rejestr w '{' '.join(line)}'")
+            arg = REGISTERS.index(line[1])
+        elif op in ADDRESS_OPS:
+            if len(line) != 2 or not line[1].isdigit():
+                raise Exception(f"Błąd w rozkazie {lineno}: Niepoprawny argument w '{' '.join(line)}'")
+            arg = int(line[1])
+        elif len(line) != 1:
+            raise Exception(f"Błąd w rozkazie {lineno}: Nadmiarowy argument w '{' '.join(line)}'")
+        ops.append(op)
+        args.append(arg)
+    return ops, args
+
+
+def run(instructions, inputs=(), max_steps=None, profile=False):
+    ops, args = decode(instructions)
+    return execute(ops, args, inputs, max_steps, profile)
+
+
+def execute(ops, args, inputs=(), max_steps=None, profile=False):
+    """Wykonuje program; przy profile=True liczby wykonań są osobne dla każdego stosu wywołań."""
+    inputs = iter(inputs)
+    size = len(ops)
+    hits = [0] * size
+    contexts = {(): hits} if profile else None
+    stack = []
+    mem = {}
+    r = [0] * 8
+    outputs = []
+    steps = 0
+    k = 0
+
+    while True:
+        if k >= size:
+            raise Exception(f"Błąd wykonania: Skok poza program ({k})")
+        if max_steps is not None:
+            steps += 1
+            if steps > max_steps:
+                raise Exception(f"Błąd wykonania: Przekroczono limit {max_steps} kroków")
+        hits[k] += 1
+        op = ops[k]
+        x = args[k]
+
+        if op == LOAD:
+            r[0] = mem.get(x, 0)
+        elif op == STORE:
+            mem[x] = r[0]
+        elif op == SWP:
+            r[0], r[x] = r[x], r[0]
+        elif op == RST:
+            r[x] = 0
+        elif op == ADD:
+            r[0] += r[x]
+        elif op == SUB:
+            r[0] = r[0] - r[x] if r[0] > r[x] else 0
+        elif op == INC:
+            r[x] += 1
+        elif op == DEC:
+            if r[x]:
+                r[x] -= 1
+        elif op == SHL:
+            r[x] <<= 1
+        elif op == SHR:
+            r[x] >>= 1
+        elif op == JZERO:
+            if r[0] == 0:
+                k = x
+                continue
+        elif op == JPOS:
+            if r[0] > 0:
+                k = x
+                continue
+        elif op == JUMP:
+            k = x
+            continue
+        elif op == RLOAD:
+            r[0] = mem.get(r[x], 0)
+        elif op == RSTORE:
+            mem[r[x]] = r[0]
+        elif op == CALL:
+            if profile:
+                stack.append(k)
+                key = tuple(stack)
+                if key not in contexts:
+                    contexts[key] = [0] * size
+                hits = contexts[key]
+            r[0] = k + 1
+            k = x
+            continue
+        elif op == RTRN:
+            if profile and stack:
+                stack.pop()
+                hits = contexts[tuple(stack)]
+            k = r[0]
+            continue
+        elif op == READ:
+            try:
+                r[0] = int(next(inputs))
+            except StopIteration:
+                raise Exception("Błąd wykonania: Brak danych wejściowych dla READ")
+        elif op == WRITE:
+            outputs.append(r[0])
+        elif op == HALT:
+            break
+        k += 1
+
+    if profile:
+        hits = [sum(counts) for counts in zip(*contexts.values())]
+    return RunResult(outputs, hits, ops, contexts)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Użycie: python vm.py <program>")
+        return
+
+    with open(sys.argv[1], 'r') as f:
+        program = f.read().splitlines()
+
+    result = run(program, sys.stdin.read().split())
+    for value in result.outputs:
+        print(f"> {value}")
+    print(f"Skończono program (koszt: {result.cost}; w tym i/o: {result.io_cost}).")
+    for name, count in sorted(result.counts.items(), key=lambda item: -item[1] * COSTS[OPCODE[item[0]]]):
+        print(f"{name:8}{count:12}{count * COSTS[OPCODE[name]]:14}")
+
+if __name__ == "__main__":
+    main()